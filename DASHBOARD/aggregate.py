@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from cube import line_dimensions
+from sketch import sketch_quantiles
+
+# Every line graph aggregation for every emotion of a filter selection in one
+# pass over the selected cube cells, so switching the aggregation dropdown is
+# a dictionary lookup. Groups are (Year, Keyword) pairs in Year, then Keyword
+# order, like groupby(sort=True).
+line_aggregations = ['mean', 'median', 'max', 'min', 'rolling_mean']
+rolling_window = 5
+
+# Percentile band drawn around the median line
+band_quantiles = {'p10': 0.1, 'p90': 0.9}
+
+
+# Start of every (Year, Keyword) run in the selected cells (already sorted)
+# and the run each cell belongs to
+def cell_segments(cells):
+    year_codes = cells.index.codes[cells.index.names.index('Year')]
+    keyword_codes = cells.index.codes[cells.index.names.index('Keyword')]
+    keyword_count = len(cells.index.levels[cells.index.names.index('Keyword')])
+    groups = year_codes.astype(np.int64) * keyword_count + keyword_codes
+    change = np.diff(groups, prepend=-1) != 0
+    return np.flatnonzero(change), np.cumsum(change) - 1
+
+
+# Mean of the last rolling_window groups of the same keyword (min_periods=1),
+# i.e. groupby('Keyword').rolling(5) over each keyword's years
+def keyword_rolling_mean(keyword_codes, means):
+    order = np.argsort(keyword_codes, kind='stable')
+    codes, values = keyword_codes[order], means[order]
+    present = ~np.isnan(values)
+    total = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(np.where(present, values, 0), axis=0)])
+    count = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(present, axis=0)])
+    position = np.arange(len(codes))
+    keyword_start = np.searchsorted(codes, codes, side='left')
+    window_start = np.maximum(position - rolling_window + 1, keyword_start)
+    window_total = total[position + 1] - total[window_start]
+    window_count = count[position + 1] - count[window_start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rolled = np.where(window_count > 0, window_total / window_count, np.nan)
+    result = np.empty_like(rolled)
+    result[order] = rolled
+    return result
+
+
+# All aggregations of the selected cells, each shaped like
+# df.groupby(['Year', 'Keyword']).agg(aggregation).reset_index(), plus the
+# band_quantiles. Medians and percentiles merge the cells' sketches.
+def line_aggregates(cells, emotions, sketches):
+    starts, segment_of_cell = cell_segments(cells)
+    keys = cells.index[starts].to_frame(index=False)[line_dimensions]
+    positions = cells['rows']['Position'].to_numpy()
+    qs = [0.5] + list(band_quantiles.values())
+    quantiles = np.stack([sketch_quantiles(sketches[emotion], positions, segment_of_cell, len(starts), qs)
+                          for emotion in emotions], axis=-1)
+
+    def reduce(stat, ufunc):
+        return ufunc.reduceat(cells[stat][emotions].to_numpy(dtype=np.float64), starts, axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = reduce('sum', np.add) / reduce('count', np.add)
+    keyword_codes = cells.index.codes[cells.index.names.index('Keyword')][starts]
+    results = {
+        'mean': mean,
+        'median': quantiles[0],
+        'max': reduce('max', np.fmax),
+        'min': reduce('min', np.fmin),
+        'rolling_mean': keyword_rolling_mean(keyword_codes, mean),
+    }
+    for i, band in enumerate(band_quantiles, start=1):
+        results[band] = quantiles[i]
+    return {aggregation: pd.concat([keys, pd.DataFrame(result, columns=emotions)], axis=1)
+            for aggregation, result in results.items()}
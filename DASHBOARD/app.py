@@ -1,44 +1,95 @@
-import pandas as pd
-import numpy as np
+import hashlib
+import json
+import os
+from functools import lru_cache
+
 import plotly.express as px
+import plotly.io as pio
+from plotly.colors import hex_to_rgb
 import dash_bootstrap_components as dbc
 from dash import Dash, dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import dash_auth
 
-# Data
-file_path = r'./assets/QuestromSA_final.csv'
-df = pd.read_csv(file_path)
+from corpus import emotion_columns, load_corpus
+from aggregate import band_quantiles, line_aggregates, line_aggregations
+from cube import build_cube, cube_keyword_counts, row_cells, select_cells
+from figcache import FigureCache, SharedFigureCache, figure_key, filter_key, normalize_selection
+from filters import build_indexes, column_arrays, filter_rows, no_rows, rows_where, take_columns
+from metrics import add_route, register_gauge, timed, track_request
+from scatter import animated_scatter, decimate, slice_years, year_points
+from sketch import build_sketches
+
+# One slim layout template for every chart, registered once: the 'plotly'
+# look for 2D charts plus the dashboard fonts. Replaces the per-figure font
+# arguments and the full 'plotly' template (polar/geo/3D/colorscale defaults)
+# that px embedded in every figure.
+plotly_template = pio.templates['plotly']
+pio.templates['dashboard'] = {
+    'layout': dict(
+        {key: plotly_template.layout[key] for key in ('autotypenumbers', 'colorway', 'hovermode', 'hoverlabel', 'paper_bgcolor',
+                                                      'plot_bgcolor', 'coloraxis', 'xaxis', 'yaxis', 'annotationdefaults', 'title')},
+        font={'family': 'Arial', 'size': 12, 'color': '#2E4053'},
+        title_font={'family': 'Arial', 'color': '#2E4053'},
+        legend_title_font_color='#2E4053',
+    ),
+    'data': {trace: plotly_template.data[trace] for trace in ('scatter', 'scattergl', 'bar', 'heatmap')},
+}
+pio.templates.default = 'dashboard'
 
-# Convert the date column to datetime format with mixed formats
-df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-df['Year'] = df['Date'].dt.year
+# Data: the CSV by default, or a merged Parquet dataset folder via CORPUS_PATH,
+# optionally limited to some keyword partitions with CORPUS_KEYWORDS=a,b
+file_path = os.environ.get('CORPUS_PATH', r'./assets/QuestromSA_final.csv')
+corpus_keywords = [keyword for keyword in os.environ.get('CORPUS_KEYWORDS', '').split(',') if keyword] or None
+compact = os.environ.get('COMPACT_CORPUS') == '1'
+df, corpus_fingerprint = load_corpus(file_path, compact=compact, keywords=corpus_keywords)
 
-# Define positive and negative sentiments
-positive_sentiments = ['Happiness', 'Love', 'Surprise']
-negative_sentiments = ['Anger', 'Disgust', 'Fear', 'Sadness']
+# Aggregate cube for the line graph and keyword distribution
+cube_emotions = [col for col in emotion_columns if col in df.columns]
+cube = build_cube(df, cube_emotions)
 
-# Positive/Negative scores
-df['Positive'] = df[positive_sentiments].sum(axis=1)
-df['Negative'] = df[negative_sentiments].sum(axis=1)
+# Quantile sketch per cube cell and emotion for medians and percentile bands;
+# cells with at most SKETCH_CENTROIDS values are kept exact
+sketch_centroids = int(os.environ.get('SKETCH_CENTROIDS', 32))
+sketches = build_sketches(df, row_cells(df), len(cube), cube_emotions, sketch_centroids)
 
-# Clean up whitespace and handle missing values
-df['Source Type'] = df['Source Type'].str.strip().fillna('')
-df['Publication Title'] = df['Publication Title'].str.strip().fillna('')
-df['Keyword'] = df['Keyword'].str.strip().fillna('')
+# Read-only column arrays and inverted indexes the callbacks filter against
+arrays = column_arrays(df)
+indexes = build_indexes(df)
 
-# Ensure numeric columns are indeed numeric
-numeric_columns = positive_sentiments + negative_sentiments + ['Positive', 'Negative']
-for col in numeric_columns:
-    df[col] = pd.to_numeric(df[col], errors='coerce')
+# Capitalism/Communism points grouped by year for the animated scatters;
+# SCATTER_DENSITY_BINS=n draws each year as an n x n density heatmap instead.
+# Otherwise at most SCATTER_MAX_POINTS markers are shipped per figure (0: no
+# limit), drawn with WebGL above SCATTER_WEBGL_POINTS.
+scatter_keywords = ['Capitalism', 'Communism']
+scatter_density_bins = int(os.environ.get('SCATTER_DENSITY_BINS', 0))
+scatter_max_points = int(os.environ.get('SCATTER_MAX_POINTS', 30000))
+scatter_webgl_points = int(os.environ.get('SCATTER_WEBGL_POINTS', 5000))
+scatter_points = {keyword: year_points(arrays, indexes['Keyword'].get(keyword, no_rows), scatter_density_bins)
+                  for keyword in scatter_keywords}
 
 # Basic Auth (replace with your own username and password)
 VALID_USERNAME_PASSWORD_PAIRS = {
     'questrom': 'ibms'
 }
 
+# gzip/brotli responses (callback JSON included) when flask-compress is installed
+try:
+    import flask_compress
+    compress = True
+except ImportError:
+    compress = False
+
 # Initialize the Dash app
-app = Dash(__name__, external_stylesheets=[dbc.themes.COSMO])
+app = Dash(__name__, external_stylesheets=[dbc.themes.COSMO], compress=compress)
+
+# WSGI entry point for gunicorn (see HerokuDeployment/gunicorn.conf.py)
+server = app.server
+
+# Per-chart timings in Prometheus text format (see metrics.py). Added before
+# BasicAuth, which (in dash-auth 1.x) only protects the routes existing then.
+add_route(server)
+
 auth = dash_auth.BasicAuth(app, VALID_USERNAME_PASSWORD_PAIRS)
 
 app.layout = html.Div([
@@ -147,28 +198,111 @@ app.layout = html.Div([
         ], className="mb-4"),
         dbc.Row([
             dbc.Col([
-                dcc.Graph(id='sentiment-line-graph', style={'height': '45vh'})
+                dcc.Loading(dcc.Graph(id='sentiment-line-graph', style={'height': '45vh'}))
             ], width=12),
         ], className="mb-4"),
         dbc.Row([
             dbc.Col([
-                dcc.Graph(id='capitalism-scatter-graph', style={'height': '45vh'})
+                dcc.Loading(dcc.Graph(id='capitalism-scatter-graph', style={'height': '45vh'}))
             ], width=4),
             dbc.Col([
-                dcc.Graph(id='communism-scatter-graph', style={'height': '45vh'})
+                dcc.Loading(dcc.Graph(id='communism-scatter-graph', style={'height': '45vh'}))
             ], width=4),
             dbc.Col([
-                dcc.Graph(id='keyword-dist-graph', style={'height': '45vh'})
+                dcc.Loading(dcc.Graph(id='keyword-dist-graph', style={'height': '45vh'}))
             ], width=4),
         ], className="mb-4"),
+        # Set in the browser once the line graph has its first figure
+        dcc.Store(id='line-rendered'),
     ], fluid=True, style={'background-color': '#EAEDED', 'padding': '40px', 'border-radius': '10px', 'margin-top': '20px', 'width': '100vw'})
 ])
 
+# Rendered figures keyed by the normalized filter selection. FIGURE_CACHE_DB
+# shares them across worker processes; the namespace ties entries to the
+# corpus (content and keyword selection) and the settings they were rendered with.
+figure_cache_bytes = int(os.environ.get('FIGURE_CACHE_MB', 64)) * 2**20
+render_settings = {
+    'corpus': {field: corpus_fingerprint.get(field) for field in ('sha256', 'keywords', 'version')},
+    'compact': compact,
+    'sketch_centroids': sketch_centroids,
+    'scatter_density_bins': scatter_density_bins,
+    'scatter_max_points': scatter_max_points,
+    'scatter_webgl_points': scatter_webgl_points,
+}
+if os.environ.get('FIGURE_CACHE_DB'):
+    figure_cache = SharedFigureCache(os.environ['FIGURE_CACHE_DB'], figure_cache_bytes,
+                                     ttl=int(os.environ.get('FIGURE_CACHE_TTL', 24 * 3600)),
+                                     namespace=hashlib.sha256(json.dumps(render_settings, sort_keys=True).encode()).hexdigest())
+else:
+    figure_cache = FigureCache(figure_cache_bytes)
+for stat in ('hits', 'misses', 'entries', 'bytes'):
+    register_gauge(f'dashboard_figure_cache_{stat}', f'Figure cache {stat}.', lambda stat=stat: figure_cache.stats()[stat])
+
+# Rows and cube cells matching the filters every chart shares, memoized on
+# the normalized selection so the callbacks fired by one interaction filter once.
+# An entry holds up to 8 bytes per corpus row (plus the selected cells) in
+# every worker, and one interaction only needs the latest selection, so the
+# default keeps just a few.
+selection_cache_size = int(os.environ.get('SELECTION_CACHE_SIZE', 4))
+
+@lru_cache(maxsize=selection_cache_size)
+def cached_selection(key):
+    selected_source, selected_publisher, selected_keyword, selected_years = key
+    with timed('shared', 'filter'):
+        rows = filter_rows(arrays, indexes, selected_source, selected_publisher, selected_keyword, selected_years)
+        cells = select_cells(cube, list(selected_source), list(selected_publisher), list(selected_keyword), selected_years)
+    rows.flags.writeable = False
+    return rows, cells
+
+def selection(selected_source, selected_publisher, selected_keyword, selected_years):
+    return cached_selection(filter_key(selected_source, selected_publisher, selected_keyword, selected_years))
+
+# Every line graph aggregation of every emotion for a selection, so changing
+# the emotions or aggregation dropdowns is a lookup
+@lru_cache(maxsize=selection_cache_size)
+def cached_aggregates(key):
+    rows, cells = cached_selection(key)
+    return line_aggregates(cells, cube_emotions, sketches)
+
+# Serve one output from the figure cache, building it on a miss
+def cached_figure(output, key, build):
+    key = (output,) + key
+    with track_request(output, key) as record:
+        figures = figure_cache.get(key)
+        record['cache'] = 'miss' if figures is None else 'hit'
+        if figures is None:
+            figures = figure_cache.put(key, (build(),), [output])
+    return figures[0]
+
+# The bottom-row charts wait for the line graph's first figure: on page load
+# they answer with a placeholder, and compute once line-rendered is set, so
+# the first response carries only the line graph
+filter_inputs = [Input('source-type-dropdown', 'value'),
+                 Input('publisher-dropdown', 'value'),
+                 Input('keyword-dropdown', 'value'),
+                 Input('year-slider', 'value'),
+                 Input('line-rendered', 'data')]
+
+loading_figure = {'layout': {'xaxis': {'visible': False}, 'yaxis': {'visible': False},
+                             'annotations': [{'text': 'Loading...', 'showarrow': False, 'font': {'size': 16, 'color': '#2E4053'}}]}}
+
+app.clientside_callback(
+    """
+    function(figure, rendered) {
+        if (rendered || !figure) {
+            return window.dash_clientside.no_update;
+        }
+        return true;
+    }
+    """,
+    Output('line-rendered', 'data'),
+    Input('sentiment-line-graph', 'figure'),
+    State('line-rendered', 'data')
+)
+
+# Only the line graph depends on the emotions and aggregation dropdowns
 @app.callback(
-    [Output('sentiment-line-graph', 'figure'),
-     Output('capitalism-scatter-graph', 'figure'),
-     Output('communism-scatter-graph', 'figure'),
-     Output('keyword-dist-graph', 'figure')],
+    Output('sentiment-line-graph', 'figure'),
     [Input('source-type-dropdown', 'value'),
      Input('publisher-dropdown', 'value'),
      Input('keyword-dropdown', 'value'),
@@ -176,38 +310,51 @@ app.layout = html.Div([
      Input('aggregation-dropdown', 'value'),
      Input('year-slider', 'value')]
 )
-def update_graph(selected_source, selected_publisher, selected_keyword, selected_emotions, aggregation_value, selected_years):
-    filtered_df = df.copy()
-    if 'All' not in selected_source:
-        filtered_df = filtered_df[filtered_df['Source Type'].isin(selected_source)]
-    if 'All' not in selected_publisher:
-        filtered_df = filtered_df[filtered_df['Publication Title'].isin(selected_publisher)]
-    if 'All' not in selected_keyword:
-        filtered_df = filtered_df[filtered_df['Keyword'].isin(selected_keyword)]
-    filtered_df = filtered_df[(filtered_df['Year'] >= selected_years[0]) & (filtered_df['Year'] <= selected_years[1])]
-    if filtered_df.empty:
-        return (px.line(title="No data available for the selected filters."),
-                px.scatter(title="No data available for the selected filters."),
-                px.scatter(title="No data available for the selected filters."),
-                px.bar(title="No data available for the selected filters."))
-
-    # Line Graph
-    numeric_columns = selected_emotions
-    if not set(numeric_columns).issubset(filtered_df.columns):
-        return (px.line(title="Please select at least one emotion."),
-                px.scatter(title="Please select at least one emotion."),
-                px.scatter(title="Please select at least one emotion."),
-                px.bar(title="Please select at least one emotion."))
-    
-    filtered_df_numeric = filtered_df[['Date', 'Year', 'Keyword'] + numeric_columns].set_index('Date')
-    if aggregation_value == 'rolling_mean':
-        filtered_df_numeric = filtered_df_numeric.groupby(['Year', 'Keyword']).mean().rolling(window=5, min_periods=1).mean().reset_index()
-    else:
-        filtered_df_numeric = filtered_df_numeric.groupby(['Year', 'Keyword']).agg(aggregation_value).reset_index()
+def update_line_graph(selected_source, selected_publisher, selected_keyword, selected_emotions, aggregation_value, selected_years):
+    key = figure_key(selected_source, selected_publisher, selected_keyword, selected_emotions, aggregation_value, selected_years)
+    return cached_figure('line', key, lambda: line_figure(selected_source, selected_publisher, selected_keyword, selected_emotions, aggregation_value, selected_years))
+
+@app.callback(Output('capitalism-scatter-graph', 'figure'), filter_inputs)
+def update_capitalism_scatter(selected_source, selected_publisher, selected_keyword, selected_years, line_rendered):
+    if not line_rendered:
+        return loading_figure
+    key = filter_key(selected_source, selected_publisher, selected_keyword, selected_years)
+    return cached_figure('capitalism_scatter', key, lambda: scatter_figure('Capitalism', selected_source, selected_publisher, selected_keyword, selected_years))
+
+@app.callback(Output('communism-scatter-graph', 'figure'), filter_inputs)
+def update_communism_scatter(selected_source, selected_publisher, selected_keyword, selected_years, line_rendered):
+    if not line_rendered:
+        return loading_figure
+    key = filter_key(selected_source, selected_publisher, selected_keyword, selected_years)
+    return cached_figure('communism_scatter', key, lambda: scatter_figure('Communism', selected_source, selected_publisher, selected_keyword, selected_years))
+
+@app.callback(Output('keyword-dist-graph', 'figure'), filter_inputs)
+def update_keyword_dist(selected_source, selected_publisher, selected_keyword, selected_years, line_rendered):
+    if not line_rendered:
+        return loading_figure
+    key = filter_key(selected_source, selected_publisher, selected_keyword, selected_years)
+    return cached_figure('keyword_bar', key, lambda: keyword_figure(selected_source, selected_publisher, selected_keyword, selected_years))
+
+# Line Graph
+def line_figure(selected_source, selected_publisher, selected_keyword, numeric_columns, aggregation_value, selected_years):
+    rows, cells = selection(selected_source, selected_publisher, selected_keyword, selected_years)
+    if len(rows) == 0:
+        return px.line(title="No data available for the selected filters.")
+    if not set(numeric_columns).issubset(df.columns):
+        return px.line(title="Please select at least one emotion.")
+
+    with timed('line', 'aggregate'):
+        if aggregation_value in line_aggregations and set(numeric_columns).issubset(cube_emotions):
+            aggregates = cached_aggregates(filter_key(selected_source, selected_publisher, selected_keyword, selected_years))
+            filtered_df_numeric = aggregates[aggregation_value][['Year', 'Keyword'] + numeric_columns]
+        else:
+            aggregates = None
+            filtered_df_numeric = take_columns(arrays, rows, ['Year', 'Keyword'] + numeric_columns)
+            filtered_df_numeric = filtered_df_numeric.groupby(['Year', 'Keyword'], observed=True).agg(aggregation_value).reset_index()
 
     if filtered_df_numeric.empty:
-        line_fig = px.line(title="No data available for the selected filters.")
-    else:
+        return px.line(title="No data available for the selected filters.")
+    with timed('line', 'figure'):
         line_fig = px.line(
             filtered_df_numeric,
             x='Year',
@@ -218,65 +365,83 @@ def update_graph(selected_source, selected_publisher, selected_keyword, selected
             labels={'Year': 'Year', 'value': 'Sentiment Score', 'variable': 'Sentiment'},
             title=f'Sentiment Trends from {selected_years[0]} to {selected_years[1]}'
         )
-        line_fig.update_layout(
-            font_family="Arial", font_size=12, font_color="#2E4053", title_font_family="Arial", title_font_color="#2E4053",
-            legend_title_font_color="#2E4053", template="plotly"
+        if aggregation_value == 'median' and aggregates is not None:
+            add_percentile_bands(line_fig, aggregates, numeric_columns)
+    return line_fig
+
+# Shade the p10-p90 range behind each keyword's median line, per emotion facet
+def add_percentile_bands(line_fig, aggregates, numeric_columns):
+    low, high = (aggregates[band] for band in band_quantiles)
+    for trace in list(line_fig.data):
+        emotion = numeric_columns[int(trace.xaxis[1:] or 1) - 1]
+        keyword = trace.legendgroup
+        selected = (low['Keyword'] == keyword).to_numpy()
+        fill = 'rgba({}, {}, {}, 0.15)'.format(*hex_to_rgb(trace.line.color))
+        band = dict(x=low['Year'][selected], mode='lines', line_width=0, legendgroup=keyword, showlegend=False,
+                    hoverinfo='skip', xaxis=trace.xaxis, yaxis=trace.yaxis)
+        line_fig.add_scatter(y=low[emotion][selected], **band)
+        line_fig.add_scatter(y=high[emotion][selected], fill='tonexty', fillcolor=fill, **band)
+
+# Scatter Plot for one keyword (Capitalism, Communism)
+def scatter_figure(keyword, selected_source, selected_publisher, selected_keyword, selected_years):
+    rows, _ = selection(selected_source, selected_publisher, selected_keyword, selected_years)
+    if len(rows) == 0:
+        return px.scatter(title="No data available for the selected filters.")
+    output = f'{keyword.lower()}_scatter'
+    with timed(output, 'filter'):
+        # Without source/publisher filters the keyword's precomputed points apply
+        unfiltered = ('All' in normalize_selection(selected_source) and 'All' in normalize_selection(selected_publisher)
+                      and {'All', keyword} & set(normalize_selection(selected_keyword)))
+        if unfiltered:
+            points = scatter_points[keyword]
+        else:
+            points = year_points(arrays, rows_where(indexes, rows, 'Keyword', keyword), scatter_density_bins)
+    with timed(output, 'aggregate'):
+        points = slice_years(points, selected_years)
+        if not scatter_density_bins:
+            points = decimate(points, scatter_max_points)
+    with timed(output, 'figure'):
+        scatter_fig = animated_scatter(points, keyword, f'Sentiment Distribution Over Time ({keyword})', scatter_webgl_points)
+        scatter_fig.update_layout(
+            margin=dict(l=0, r=0, t=30, b=0),
+            xaxis=dict(range=[0, 1]),
+            yaxis=dict(range=[0, 1])
+        )
+    return scatter_fig
+
+# Keyword Distribution Over Time
+def keyword_figure(selected_source, selected_publisher, selected_keyword, selected_years):
+    rows, cells = selection(selected_source, selected_publisher, selected_keyword, selected_years)
+    if len(rows) == 0:
+        return px.bar(title="No data available for the selected filters.")
+    with timed('keyword_bar', 'aggregate'):
+        keyword_dist = cube_keyword_counts(cells)
+    with timed('keyword_bar', 'figure'):
+        bar_fig = px.bar(
+            keyword_dist,
+            x='Year',
+            y='Count',
+            color='Keyword',
+            labels={'Count': 'Count of Observations'},
+            title='Keyword Distribution Over Time'
+        )
+        bar_fig.update_layout(
+            barmode='stack',
+            margin=dict(l=0, r=0, t=30, b=0)
         )
+    return bar_fig
 
-    # Scatter Plot for Capitalism
-    capitalism_df = filtered_df[filtered_df['Keyword'] == 'Capitalism']
-    scatter_fig1 = px.scatter(
-        capitalism_df.sort_values('Year'), x='Negative', y='Positive',
-        animation_frame='Year',
-        color='Keyword',
-        labels={'Positive': 'Positive Sentiment', 'Negative': 'Negative Sentiment'},
-        title='Sentiment Distribution Over Time (Capitalism)'
-    )
-    scatter_fig1.update_layout(
-        font_family="Arial", font_size=12, font_color="#2E4053", title_font_family="Arial", title_font_color="#2E4053",
-        legend_title_font_color="#2E4053", template="plotly",
-        margin=dict(l=0, r=0, t=30, b=0),
-        xaxis=dict(range=[0, 1]),
-        yaxis=dict(range=[0, 1])
-    )
-
-    # Scatter Plot for Communism
-    communism_df = filtered_df[filtered_df['Keyword'] == 'Communism']
-    scatter_fig2 = px.scatter(
-        communism_df.sort_values('Year'), x='Negative', y='Positive',
-        animation_frame='Year',
-        color='Keyword',
-        labels={'Positive': 'Positive Sentiment', 'Negative': 'Negative Sentiment'},
-        title='Sentiment Distribution Over Time (Communism)'
-    )
-    scatter_fig2.update_layout(
-        font_family="Arial", font_size=12, font_color="#2E4053", title_font_family="Arial", title_font_color="#2E4053",
-        legend_title_font_color="#2E4053", template="plotly",
-        margin=dict(l=0, r=0, t=30, b=0),
-        xaxis=dict(range=[0, 1]),
-        yaxis=dict(range=[0, 1])
-    )
-
-    # Keyword Distribution Over Time
-    keyword_dist = filtered_df.groupby(['Year', 'Keyword']).size().reset_index(name='Count')
-    bar_fig = px.bar(
-        keyword_dist,
-        x='Year',
-        y='Count',
-        color='Keyword',
-        labels={'Count': 'Count of Observations'},
-        title='Keyword Distribution Over Time'
-    )
-    bar_fig.update_layout(
-        font_family="Arial", font_size=12, font_color="#2E4053", title_font_family="Arial", title_font_color="#2E4053",
-        legend_title_font_color="#2E4053", template="plotly",
-        barmode='stack',
-        margin=dict(l=0, r=0, t=30, b=0)
-    )
-
-    return line_fig, scatter_fig1, scatter_fig2, bar_fig
+# Render the default view once at startup and keep it cached
+default_view = (['All'], ['All'], ['All'], ['Positive', 'Negative'], 'mean', [int(df['Year'].min()), int(df['Year'].max())])
+default_filters = default_view[:3] + default_view[5:]
+update_line_graph(*default_view)
+update_capitalism_scatter(*default_filters, True)
+update_communism_scatter(*default_filters, True)
+update_keyword_dist(*default_filters, True)
+figure_cache.pin(('line',) + figure_key(*default_view))
+for output in ('capitalism_scatter', 'communism_scatter', 'keyword_bar'):
+    figure_cache.pin((output,) + filter_key(*default_filters))
 
 if __name__ == '__main__':
-    import os
     port = int(os.environ.get('PORT', 8050))
     app.run_server(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
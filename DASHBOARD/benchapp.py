@@ -0,0 +1,212 @@
+### Latency benchmark for the dashboard callback.
+### Builds synthetic corpora with the dashboard's schema, imports app.py against
+### each one (in a fresh process, via CORPUS_PATH) and calls the chart callbacks
+### and per-chart builders directly over a matrix of filter/aggregation inputs.
+### Reports p50/p95/p99 latency and tracemalloc allocations per chart as JSON, e.g.
+###     python benchapp.py --rows 10000 100000 1000000 --repeat 3 --report bench.json
+### No browser or server is involved.
+
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import corpus
+from figcache import serialize_figures
+
+keywords = ['Capitalism', 'Communism', 'Socialism', 'Fascism']
+source_types = ['Newspapers', 'Magazines', 'Scholarly Journals', 'Blogs, Podcasts, & Websites']
+emotions = ['Anger', 'Disgust', 'Fear', 'Sadness', 'Happiness', 'Love', 'Surprise']
+
+
+# Synthetic QuestromSA_final.csv: Date, Keyword, Source Type, Publication Title
+# and the seven emotion scores, written in chunks so 10M rows fit in memory
+def write_corpus(path, rows, seed, publishers=2000, chunk_rows=1000000):
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk_rows):
+        n = min(chunk_rows, rows - start)
+        dates = pd.to_datetime({'year': rng.integers(1950, 2024, n), 'month': rng.integers(1, 13, n), 'day': rng.integers(1, 29, n)})
+        scores = rng.dirichlet(np.ones(len(emotions)), n)
+        chunk = pd.DataFrame({
+            'Date': dates.dt.strftime('%Y-%m-%d'),
+            'Keyword': rng.choice(keywords, n),
+            'Source Type': rng.choice(source_types, n),
+            # Zipf-like publisher popularity, like the real corpus
+            'Publication Title': np.char.add('Publication ', np.minimum(rng.zipf(1.3, n), publishers).astype(str)),
+            **{emotion: scores[:, i] for i, emotion in enumerate(emotions)},
+        })
+        chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+# Filter/aggregation inputs, in update_line_graph's argument order
+def input_matrix(years):
+    first, last = years
+    filters = [
+        (['All'], ['All']),
+        (['Newspapers'], ['All']),
+        (['Newspapers', 'Magazines'], ['Publication 1', 'Publication 2', 'Publication 3']),
+    ]
+    keyword_selections = [['All'], ['Capitalism'], ['Capitalism', 'Communism']]
+    emotion_selections = [['Positive', 'Negative'], ['Positive', 'Negative'] + emotions]
+    aggregations = ['mean', 'median', 'max', 'min', 'rolling_mean']
+    year_ranges = [[first, last], [max(first, last - 20), last]]
+    return [(source, publisher, keyword, selected_emotions, aggregation, selected_years)
+            for (source, publisher), keyword, selected_emotions, aggregation, selected_years
+            in itertools.product(filters, keyword_selections, emotion_selections, aggregations, year_ranges)]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    quantiles = statistics.quantiles(samples, n=100) if len(samples) > 1 else samples * 99
+    return {'n': len(samples), 'p50_ms': round(quantiles[49] * 1000, 2),
+            'p95_ms': round(quantiles[94] * 1000, 2), 'p99_ms': round(quantiles[98] * 1000, 2)}
+
+
+# One interaction split into its steps: the shared filter step, each chart's
+# builder, serializing the four figures, and the four callbacks end to end.
+# Each step is called with the results of the ones before.
+def chart_steps(app, case):
+    selected_source, selected_publisher, selected_keyword, selected_emotions, aggregation_value, selected_years = case
+    filters = (selected_source, selected_publisher, selected_keyword, selected_years)
+    figures = {}
+
+    def filter_step():
+        app.cached_selection.cache_clear()
+        app.cached_aggregates.cache_clear()
+        app.selection(*filters)
+
+    def build(name, builder):
+        def step():
+            figures[name] = builder()
+        return step
+
+    def callbacks_step():
+        app.cached_selection.cache_clear()
+        app.cached_aggregates.cache_clear()
+        app.update_line_graph(*case)
+        app.update_capitalism_scatter(*filters, True)
+        app.update_communism_scatter(*filters, True)
+        app.update_keyword_dist(*filters, True)
+
+    return [
+        ('filter', filter_step),
+        ('line', build('line', lambda: app.line_figure(*case))),
+        ('capitalism_scatter', build('capitalism_scatter', lambda: app.scatter_figure('Capitalism', *filters))),
+        ('communism_scatter', build('communism_scatter', lambda: app.scatter_figure('Communism', *filters))),
+        ('keyword_bar', build('keyword_bar', lambda: app.keyword_figure(*filters))),
+        ('serialize', lambda: serialize_figures(list(figures.values()))),
+        ('callbacks', callbacks_step),
+        # changing only the emotions or aggregation fires the line graph alone
+        ('line_callback', lambda: app.update_line_graph(*case)),
+    ]
+
+
+# Run the matrix against an already imported app module
+def run_matrix(app, cases, repeat, allocations):
+    timings, allocated, peaks = {}, {}, {}
+    for case in cases:
+        for _ in range(repeat):
+            for name, step in chart_steps(app, case):
+                start = time.perf_counter()
+                step()
+                timings.setdefault(name, []).append(time.perf_counter() - start)
+        if allocations:
+            # separate pass: tracemalloc slows allocation-heavy code down
+            for name, step in chart_steps(app, case):
+                tracemalloc.start()
+                step()
+                size, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+                allocated.setdefault(name, []).append(sum(stat.size for stat in snapshot.statistics('filename')))
+                peaks.setdefault(name, []).append(peak)
+    report = {}
+    for name, samples in timings.items():
+        report[name] = percentiles(samples)
+        if allocations:
+            report[name]['retained_kb_mean'] = round(statistics.mean(allocated[name]) / 1024, 1)
+            report[name]['peak_alloc_kb_p50'] = round(statistics.median(peaks[name]) / 1024, 1)
+            report[name]['peak_alloc_kb_max'] = round(max(peaks[name]) / 1024, 1)
+    return report
+
+
+# Child process: import app.py against the corpus in CORPUS_PATH and benchmark it
+def bench_corpus(args):
+    corpus.cache_folder_path = os.path.join(os.path.dirname(os.path.abspath(os.environ['CORPUS_PATH'])), 'cache')
+    start = time.perf_counter()
+    import app
+    startup = time.perf_counter() - start
+
+    cases = input_matrix([int(app.df['Year'].min()), int(app.df['Year'].max())])
+    if args.cases and args.cases < len(cases):
+        cases = random.Random(args.seed).sample(cases, args.cases)
+    report = {
+        'rows': len(app.df),
+        'startup_s': round(startup, 2),
+        'cases': len(cases),
+        'repeat': args.repeat,
+        'charts': run_matrix(app, cases, args.repeat, not args.no_allocations),
+    }
+    print(json.dumps(report))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless latency benchmark for the dashboard callback')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3, help='timed calls per input combination')
+    parser.add_argument('--cases', type=int, help='sample this many input combinations from the matrix')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compact', action='store_true', help='run with COMPACT_CORPUS=1')
+    parser.add_argument('--no-allocations', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--workdir', help='where to write the corpora (default: a temporary folder)')
+    parser.add_argument('--report', help='write the JSON report here instead of stdout')
+    parser.add_argument('--corpus', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.corpus:
+        bench_corpus(args)
+        return
+
+    root = args.workdir or tempfile.mkdtemp(prefix='benchapp-')
+    results = []
+    try:
+        for rows in args.rows:
+            path = os.path.join(root, f'corpus-{rows}.csv')
+            if not os.path.exists(path):
+                write_corpus(path, rows, args.seed)
+            # Every call is a cache miss: FIGURE_CACHE_MB=0 stores nothing
+            env = dict(os.environ, CORPUS_PATH=path, FIGURE_CACHE_MB='0', COMPACT_CORPUS='1' if args.compact else '0')
+            env.pop('FIGURE_CACHE_DB', None)
+            command = [sys.executable, os.path.abspath(__file__), '--corpus', path, '--repeat', str(args.repeat), '--seed', str(args.seed)]
+            if args.cases:
+                command += ['--cases', str(args.cases)]
+            if args.no_allocations:
+                command.append('--no-allocations')
+            output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+            print(f"{rows} rows done", file=sys.stderr)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    text = json.dumps({'compact': args.compact, 'pandas': pd.__version__, 'corpora': results}, indent=2)
+    if args.report:
+        with open(args.report, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import numpy as np
+
+# Mergeable quantile sketches, one per cube cell and emotion, so medians and
+# percentiles of any filter selection are answered without touching the rows.
+# A cell with at most `centroids` values keeps them all (exact); a larger one
+# keeps `centroids` equal-weight centroids (mean and count of consecutive
+# sorted values), so a merged quantile is off by at most about n/centroids
+# ranks of the n values selected. Quantiles use linear interpolation between
+# ranks, like pandas, and are exact when every selected cell is exact.
+#
+# Only the centroid means are stored per emotion. A centroid's weight follows
+# from its cell's value count, so the layout (offsets and the counts of the
+# large cells) is shared by every emotion with values in the same rows.
+
+
+# Sketch of one emotion: centroids of cell c are means[offsets[c]:offsets[c + 1]],
+# sorted by value; large/large_counts are the cells with more than `centroids`
+# values and their counts. cells holds the cube cell of every row (-1: not in the cube).
+def build_sketch(cells, values, cell_count, centroids):
+    keep = (cells >= 0) & ~np.isnan(values)
+    cell, value = cells[keep], values[keep]
+    order = np.lexsort((value, cell))
+    cell, value = cell[order], value[order]
+
+    counts = np.bincount(cell, minlength=cell_count)
+    firsts = np.cumsum(counts) - counts
+    rank = np.arange(len(cell)) - firsts[cell]
+    size = counts[cell]
+    bucket = np.where(size > centroids, rank * centroids // np.maximum(size, 1), rank)
+
+    width = np.minimum(counts, centroids)
+    slot_offsets = np.concatenate([[0], np.cumsum(width)])
+    slot = slot_offsets[cell] + bucket
+    weights = np.bincount(slot, minlength=slot_offsets[-1])
+    sums = np.bincount(slot, weights=value, minlength=slot_offsets[-1])
+    large = np.flatnonzero(counts > centroids)
+    return {
+        'offsets': slot_offsets.astype(np.uint32),
+        'large': large.astype(np.int32),
+        'large_counts': counts[large].astype(np.uint32),
+        'means': (sums / np.maximum(weights, 1)).astype(values.dtype),
+    }
+
+
+def build_sketches(df, cells, cell_count, emotions, centroids):
+    sketches = {}
+    for emotion in emotions:
+        sketch = build_sketch(cells, df[emotion].to_numpy(), cell_count, centroids)
+        # reuse an earlier emotion's layout arrays when they are the same
+        for other in sketches.values():
+            if all(np.array_equal(sketch[part], other[part]) for part in ('offsets', 'large', 'large_counts')):
+                sketch.update({part: other[part] for part in ('offsets', 'large', 'large_counts')})
+                break
+        sketches[emotion] = sketch
+    return sketches
+
+
+# Weight of centroid j of a cell with n values in `width` centroids: the
+# ranks r with r * width // n == j (1 for every value of an exact cell)
+def centroid_weights(local, counts, widths):
+    return (-(-(local + 1) * counts // widths) + (-local * counts // widths)).astype(np.int64)
+
+
+# Quantiles qs of the values in the given cells, merged per group:
+# group_of_cell[i] is the group of cell positions[i], groups are 0..group_count-1.
+# Returns an array of shape (len(qs), group_count), NaN for empty groups.
+def sketch_quantiles(sketch, positions, group_of_cell, group_count, qs):
+    offsets = sketch['offsets']
+    starts = offsets[positions].astype(np.int64)
+    lengths = offsets[positions + 1].astype(np.int64) - starts
+    local = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    gather = np.repeat(starts, lengths) + local
+    group = np.repeat(group_of_cell, lengths)
+
+    # value count of every cell: its width, unless it is a large cell
+    counts = lengths.copy()
+    found = np.searchsorted(sketch['large'], positions)
+    large = found < len(sketch['large'])
+    large[large] = sketch['large'][found[large]] == positions[large]
+    counts[large] = sketch['large_counts'][found[large]]
+    means = sketch['means'][gather]
+    weights = centroid_weights(local, np.repeat(counts, lengths), np.repeat(lengths, lengths))
+
+    order = np.lexsort((means, group))
+    means, weights = means[order], weights[order]
+    reach = np.cumsum(weights, dtype=np.int64)
+    totals = np.bincount(group, weights=weights, minlength=group_count).astype(np.int64)
+    bases = np.cumsum(totals) - totals
+
+    result = np.full((len(qs), group_count), np.nan)
+    has = totals > 0
+    for i, q in enumerate(qs):
+        position = (totals[has] - 1) * q
+        low, high = np.floor(position).astype(np.int64), np.ceil(position).astype(np.int64)
+        low_value = means[np.searchsorted(reach, bases[has] + low, side='right')].astype(np.float64)
+        high_value = means[np.searchsorted(reach, bases[has] + high, side='right')].astype(np.float64)
+        result[i, has] = low_value + (position - low) * (high_value - low_value)
+    return result
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# Define positive and negative sentiments
+positive_sentiments = ['Happiness', 'Love', 'Surprise']
+negative_sentiments = ['Anger', 'Disgust', 'Fear', 'Sadness']
+numeric_columns = positive_sentiments + negative_sentiments + ['Positive', 'Negative']
+string_columns = ['Source Type', 'Publication Title', 'Keyword']
+
+# Columns the dashboard actually reads (Neutral/Other are optional in the CSV)
+emotion_columns = ['Positive', 'Negative', 'Anger', 'Disgust', 'Fear', 'Sadness', 'Happiness', 'Love', 'Surprise', 'Neutral', 'Other']
+source_columns = ['Date'] + string_columns + positive_sentiments + negative_sentiments + ['Neutral', 'Other']
+
+# Snapshots live outside ./assets so Dash does not serve them
+cache_folder_path = r'./cache/'
+
+# Bump when preprocess() changes so old snapshots are rebuilt
+snapshot_version = 2
+
+
+# Read the dashboard's columns from a CSV file or from a Parquet dataset
+# folder written by the MERGE scripts (partitioned by Keyword and Year), where
+# only the selected keywords' partitions and the needed columns are read.
+# String columns the source lacks (a vismerge dataset has no Source Type or
+# Publication Title) are left empty.
+def read_source(file_path, keywords=None):
+    if os.path.isdir(file_path):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        # typed like MERGE/dataset.py writes them; a null Year partition cannot be read as a dictionary
+        partitioning = ds.partitioning(pa.schema([('Keyword', pa.string()), ('Year', pa.int32())]), flavor='hive')
+        dataset = ds.dataset(file_path, format='parquet', partitioning=partitioning)
+        columns = [col for col in source_columns if col in dataset.schema.names]
+        row_filter = ds.field('Keyword').isin(list(keywords)) if keywords else None
+        df = dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+    else:
+        df = pd.read_csv(file_path, usecols=lambda col: col in source_columns)
+        if keywords:
+            # compared like preprocess() will clean them (the CSV has ' Capitalism')
+            df = df[df['Keyword'].astype(str).str.strip().isin(keywords)].reset_index(drop=True)
+    for col in string_columns:
+        if col not in df.columns:
+            df[col] = ''
+    return df
+
+
+# Parse the raw data and apply the dashboard's cleaning steps
+def preprocess(file_path, keywords=None):
+    df = read_source(file_path, keywords)
+
+    # Convert the date column to datetime format with mixed formats
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    df['Year'] = df['Date'].dt.year
+
+    # Positive/Negative scores
+    df['Positive'] = df[positive_sentiments].sum(axis=1)
+    df['Negative'] = df[negative_sentiments].sum(axis=1)
+
+    # Clean up whitespace and handle missing values
+    for col in string_columns:
+        df[col] = df[col].astype(object).str.strip().fillna('')
+
+    # Ensure numeric columns are indeed numeric
+    for col in numeric_columns:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    return df
+
+
+# The CSV itself, or every file of a dataset folder
+def source_files(file_path):
+    if os.path.isdir(file_path):
+        return sorted(os.path.join(root, file) for root, dirs, files in os.walk(file_path) for file in files)
+    return [file_path]
+
+
+# Size, mtime and content hash of the source data, plus the keyword selection
+def source_fingerprint(file_path, with_hash=True, keywords=None):
+    stats = [os.stat(file) for file in source_files(file_path)]
+    fingerprint = {'size': sum(stat.st_size for stat in stats), 'mtime_ns': max((stat.st_mtime_ns for stat in stats), default=0),
+                   'version': snapshot_version, 'keywords': sorted(keywords) if keywords else None}
+    if with_hash:
+        sha = hashlib.sha256()
+        for file in source_files(file_path):
+            sha.update(os.path.relpath(file, file_path).encode())
+            with open(file, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(chunk)
+        fingerprint['sha256'] = sha.hexdigest()
+    return fingerprint
+
+
+def snapshot_paths(file_path, keywords=None):
+    name = os.path.splitext(os.path.basename(os.path.normpath(file_path)))[0]
+    if keywords:
+        name += '-' + hashlib.sha1(','.join(sorted(keywords)).encode()).hexdigest()[:8]
+    return (os.path.join(cache_folder_path, name + '.parquet'),
+            os.path.join(cache_folder_path, name + '.json'))
+
+
+def read_snapshot_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot_meta(meta_path, meta):
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+# Return the fingerprint of a snapshot that still matches the CSV, or None.
+# size+mtime is trusted as-is; a changed mtime falls back to the content hash
+# (git checkouts and slug builds touch mtimes without changing the data).
+def valid_snapshot(file_path, keywords=None):
+    snapshot_path, meta_path = snapshot_paths(file_path, keywords)
+    meta = read_snapshot_meta(meta_path)
+    if meta is None or not os.path.exists(snapshot_path):
+        return None
+    current = source_fingerprint(file_path, with_hash=False, keywords=keywords)
+    if any(current[field] != meta.get(field) for field in ('size', 'version', 'keywords')):
+        return None
+    if current['mtime_ns'] == meta.get('mtime_ns'):
+        return meta
+    current = source_fingerprint(file_path, keywords=keywords)
+    if current['sha256'] != meta.get('sha256'):
+        return None
+    write_snapshot_meta(meta_path, current)
+    return current
+
+
+# Parse the source and write a Parquet snapshot next to its fingerprint
+def build_snapshot(file_path, keywords=None):
+    df = preprocess(file_path, keywords)
+    snapshot_path, meta_path = snapshot_paths(file_path, keywords)
+    fingerprint = source_fingerprint(file_path, keywords=keywords)
+    try:
+        os.makedirs(cache_folder_path, exist_ok=True)
+        tmp_path = snapshot_path + '.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, snapshot_path)
+        write_snapshot_meta(meta_path, fingerprint)
+    except (ImportError, OSError) as e:
+        # No parquet engine or read-only filesystem: serve from the parsed CSV
+        print(f"Corpus snapshot not written ({e}); using parsed CSV")
+    return df, fingerprint
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+# Dictionary-encode the string columns, store scores as float32 and Year as
+# int16. Rows without a parseable date are dropped: the year slider never
+# selects them, so no chart can show them.
+def compact_corpus(df):
+    before = memory_mb(df)
+    df = df[df['Year'].notna()].reset_index(drop=True)
+    for col in string_columns:
+        df[col] = df[col].astype('category')
+    for col in emotion_columns:
+        if col in df.columns:
+            df[col] = df[col].astype('float32')
+    df['Year'] = df['Year'].astype('int16')
+    print(f"Corpus memory: {before:.1f} MB -> {memory_mb(df):.1f} MB (compact)")
+    return df
+
+
+# Load the preprocessed corpus, from the snapshot when it is still valid
+def load_corpus(file_path, compact=False, keywords=None):
+    df = None
+    meta = valid_snapshot(file_path, keywords)
+    if meta is not None:
+        try:
+            df = pd.read_parquet(snapshot_paths(file_path, keywords)[0])
+        except (ImportError, OSError, ValueError) as e:
+            print(f"Corpus snapshot unreadable ({e}); rebuilding")
+    if df is None:
+        df, meta = build_snapshot(file_path, keywords)
+    if compact:
+        df = compact_corpus(df)
+    return df, meta
+
+
+# Build the snapshot ahead of time (e.g. during a Heroku slug compile)
+if __name__ == '__main__':
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else r'./assets/QuestromSA_final.csv'
+    if valid_snapshot(path) is None:
+        build_snapshot(path)
+        print(f"Snapshot written for {path}")
+    else:
+        print(f"Snapshot for {path} is up to date")
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+# One cell per (Year, Keyword, Source Type, Publication Title) combination
+cube_dimensions = ['Year', 'Keyword', 'Source Type', 'Publication Title']
+line_dimensions = ['Year', 'Keyword']
+
+
+# Precompute count/sum/min/max per emotion for every cell, plus the row count
+# and position of the cell. Sums are accumulated in float64 and stored, like
+# min/max, in the scores' own dtype (float32 for a compact corpus); counts are
+# int32: with Publication Title in the grain there is roughly one cell per
+# two or three rows, so the cube is about as large as the corpus itself.
+def build_cube(df, emotions):
+    keys = [df[col] for col in cube_dimensions]
+    values = df[emotions]
+    dtype = np.result_type(*values.dtypes)
+    grouped = values.groupby(keys, sort=True, observed=True)
+    sums = values.astype('float64').groupby(keys, sort=True, observed=True).sum()
+    rows = grouped.size().astype(np.int32).to_frame('Count')
+    rows['Position'] = np.arange(len(rows), dtype=np.int32)
+    return pd.concat({
+        'count': grouped.count().astype(np.int32),
+        'sum': sums.astype(dtype),
+        'min': grouped.min().astype(dtype),
+        'max': grouped.max().astype(dtype),
+        'rows': rows,
+    }, axis=1)
+
+
+# Cube cell (position) of every row; -1 for rows the cube leaves out
+def row_cells(df):
+    cells = df.groupby([df[col] for col in cube_dimensions], sort=True, observed=True).ngroup()
+    return cells.fillna(-1).to_numpy(dtype=np.int64)
+
+
+# Cells matching the dashboard filters
+def select_cells(cube, selected_source, selected_publisher, selected_keyword, selected_years):
+    index = cube.index
+    year = index.get_level_values('Year')
+    mask = (year >= selected_years[0]) & (year <= selected_years[1])
+    if 'All' not in selected_source:
+        mask &= index.get_level_values('Source Type').isin(selected_source)
+    if 'All' not in selected_publisher:
+        mask &= index.get_level_values('Publication Title').isin(selected_publisher)
+    if 'All' not in selected_keyword:
+        mask &= index.get_level_values('Keyword').isin(selected_keyword)
+    return cube[mask]
+
+
+# Row counts per (Year, Keyword) for the keyword distribution chart
+def cube_keyword_counts(cells):
+    return cells['rows'].groupby(level=line_dimensions, sort=True)['Count'].sum().reset_index()
@@ -0,0 +1,226 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import plotly.io as pio
+
+from metrics import timed
+
+
+# Normalize a multi-select value: order and duplicates do not change the
+# filter, and any selection containing 'All' means no filter at all
+def normalize_selection(values):
+    if isinstance(values, str):
+        values = [values]
+    values = list(values or [])
+    if 'All' in values:
+        return ('All',)
+    return tuple(sorted(set(values)))
+
+
+# Cache key for the line graph's inputs. Emotion order is kept because it sets
+# the facet order of the line graph.
+def figure_key(selected_source, selected_publisher, selected_keyword, selected_emotions, aggregation_value, selected_years):
+    return (normalize_selection(selected_source),
+            normalize_selection(selected_publisher),
+            normalize_selection(selected_keyword),
+            tuple(dict.fromkeys(selected_emotions or [])),
+            aggregation_value,
+            tuple(int(year) for year in selected_years))
+
+
+# Cache key for the charts that only depend on the filters
+def filter_key(selected_source, selected_publisher, selected_keyword, selected_years):
+    return (normalize_selection(selected_source),
+            normalize_selection(selected_publisher),
+            normalize_selection(selected_keyword),
+            tuple(int(year) for year in selected_years))
+
+
+# plotly.js decodes typed arrays (below) from 2.28 on. Checked once against the
+# bundle plotly.py serves: plotly 5.14 ships 2.20, which gets plain JSON lists.
+def plotlyjs_decodes_typed_arrays():
+    from plotly.offline import get_plotlyjs_version
+    version = tuple(int(part) for part in get_plotlyjs_version().split('.')[:2])
+    return version >= (2, 28)
+
+
+typed_arrays = plotlyjs_decodes_typed_arrays()
+
+
+# Numeric array in plotly.js' typed-array form: base64 of the little-endian
+# buffer instead of a JSON list of numbers. plotly.js has no 64-bit integers,
+# so those are narrowed to int32 (or sent as float64 if they do not fit).
+def typed_array(values):
+    if values.dtype.kind in 'iu' and values.dtype.itemsize == 8:
+        fits = values.size == 0 or (values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max)
+        values = values.astype(np.int32 if fits else np.float64)
+    values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<'))
+    spec = {'dtype': values.dtype.str[1:], 'bdata': base64.b64encode(values).decode('ascii')}
+    if values.ndim > 1:
+        spec['shape'] = ','.join(str(size) for size in values.shape)
+    return spec
+
+
+def encode_arrays(obj):
+    if isinstance(obj, dict):
+        return {key: encode_arrays(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [encode_arrays(value) for value in obj]
+    if typed_arrays and isinstance(obj, np.ndarray) and obj.dtype.kind in 'iuf':
+        return typed_array(obj)
+    return obj
+
+
+def serialize_figure(fig):
+    if hasattr(fig, 'to_plotly_json'):
+        fig = fig.to_plotly_json()
+    return pio.to_json(encode_arrays(fig), validate=False)
+
+
+# names labels each figure's serialization time in the metrics
+def serialize_figures(figures, names=None):
+    if names is None:
+        return tuple(serialize_figure(fig) for fig in figures)
+    value = []
+    for name, fig in zip(names, figures):
+        with timed(name, 'serialize'):
+            value.append(serialize_figure(fig))
+    return tuple(value)
+
+
+def deserialize_figures(value):
+    return tuple(json.loads(fig_json) for fig_json in value)
+
+
+# Bounded LRU of serialized figures, sized by the JSON it holds.
+# Pinned keys (the default view) are never evicted.
+class FigureCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.pinned = set()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return deserialize_figures(value)
+
+    def put(self, key, figures, names=None):
+        value = serialize_figures(figures, names)
+        size = sum(len(fig_json) for fig_json in value)
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= sum(len(fig_json) for fig_json in self.entries.pop(key))
+            if size <= self.max_bytes:
+                self.entries[key] = value
+                self.bytes += size
+                self.evict()
+        return deserialize_figures(value)
+
+    def pin(self, key):
+        with self.lock:
+            self.pinned.add(key)
+
+    # Drop least recently used unpinned entries until under the byte budget
+    def evict(self):
+        for key in list(self.entries):
+            if self.bytes <= self.max_bytes:
+                break
+            if key not in self.pinned:
+                self.bytes -= sum(len(fig_json) for fig_json in self.entries.pop(key))
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.bytes}
+
+
+# Figure cache in a SQLite file shared by every worker process on the host.
+# Entries expire after ttl seconds (pinned ones never do), the file is kept
+# under max_bytes by evicting least recently used entries, and entries from
+# any other namespace (an older corpus snapshot) are purged on startup.
+class SharedFigureCache:
+    def __init__(self, path, max_bytes, ttl, namespace):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.local = threading.local()
+        with self.connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS figures ('
+                         'key TEXT PRIMARY KEY, namespace TEXT, value TEXT, size INTEGER, '
+                         'created REAL, accessed REAL, pinned INTEGER DEFAULT 0)')
+            conn.execute('DELETE FROM figures WHERE namespace != ?', (namespace,))
+
+    # One connection per thread, reopened after a fork
+    def connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        key = json.dumps(key)
+        now = time.time()
+        with self.connect() as conn:
+            row = conn.execute('SELECT value, created, pinned FROM figures WHERE key = ? AND namespace = ?',
+                               (key, self.namespace)).fetchone()
+            if row is None or (not row[2] and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            conn.execute('UPDATE figures SET accessed = ? WHERE key = ?', (now, key))
+        self.hits += 1
+        return tuple(json.loads(row[0]))
+
+    def put(self, key, figures, names=None):
+        value = serialize_figures(figures, names)
+        text = '[' + ','.join(value) + ']'
+        now = time.time()
+        with self.connect() as conn:
+            if len(text) <= self.max_bytes:
+                conn.execute('INSERT OR REPLACE INTO figures (key, namespace, value, size, created, accessed, pinned) '
+                             'VALUES (?, ?, ?, ?, ?, ?, COALESCE((SELECT pinned FROM figures WHERE key = ?), 0))',
+                             (json.dumps(key), self.namespace, text, len(text), now, now, json.dumps(key)))
+            self.evict(conn, now)
+        return deserialize_figures(value)
+
+    def pin(self, key):
+        with self.connect() as conn:
+            conn.execute('UPDATE figures SET pinned = 1 WHERE key = ?', (json.dumps(key),))
+
+    # Drop expired entries, then least recently used ones until under the budget
+    def evict(self, conn, now):
+        conn.execute('DELETE FROM figures WHERE pinned = 0 AND created < ?', (now - self.ttl,))
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM figures').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute('SELECT key, size FROM figures WHERE pinned = 0 ORDER BY accessed').fetchall():
+            conn.execute('DELETE FROM figures WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self.connect() as conn:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM figures').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+
+# Read-only column arrays shared by every callback (no per-request copies)
+def column_arrays(df):
+    arrays = {}
+    for col in df.columns:
+        if df[col].dtype.kind in 'biuf':
+            values = df[col].to_numpy()
+            values.flags.writeable = False
+        else:
+            values = df[col].array
+        arrays[col] = values
+    return arrays
+
+
+# Columns filtered by the multi-select dropdowns
+index_columns = ['Source Type', 'Publication Title', 'Keyword']
+no_rows = np.empty(0, dtype=np.intp)
+
+
+# Inverted index: sorted row ids for every distinct value of a column
+def build_inverted_index(values):
+    codes, uniques = pd.factorize(values)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)}
+
+
+def build_indexes(df):
+    return {col: build_inverted_index(df[col]) for col in index_columns}
+
+
+# OR: rows holding any of the selected values (ids are disjoint per value)
+def rows_for_values(index, selected):
+    parts = [index[value] for value in dict.fromkeys(selected) if value in index]
+    if not parts:
+        return no_rows
+    if len(parts) == 1:
+        return parts[0]
+    return np.sort(np.concatenate(parts))
+
+
+# AND the categorical filters, smallest row-id set first, then apply the year range
+def filter_rows(arrays, indexes, selected_source, selected_publisher, selected_keyword, selected_years):
+    selections = [(col, selected) for col, selected in zip(index_columns, (selected_source, selected_publisher, selected_keyword))
+                  if 'All' not in selected]
+    row_sets = sorted((rows_for_values(indexes[col], selected) for col, selected in selections), key=len)
+    if row_sets:
+        rows = row_sets[0]
+        for other in row_sets[1:]:
+            if len(rows) == 0:
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        year = arrays['Year'][rows]
+        return rows[(year >= selected_years[0]) & (year <= selected_years[1])]
+    year = arrays['Year']
+    return np.flatnonzero((year >= selected_years[0]) & (year <= selected_years[1]))
+
+
+# Narrow rows to those whose column equals value
+def rows_where(indexes, rows, col, value):
+    return np.intersect1d(rows, indexes[col].get(value, no_rows), assume_unique=True)
+
+
+# Materialize only the requested columns for the selected rows
+def take_columns(arrays, rows, columns):
+    return pd.DataFrame({col: arrays[col].take(rows) for col in columns})
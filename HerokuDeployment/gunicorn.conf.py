@@ -0,0 +1,29 @@
+import gc
+import multiprocessing
+import os
+
+# Heroku sets PORT and WEB_CONCURRENCY; the fallbacks are for local runs
+bind = f"0.0.0.0:{os.environ.get('PORT', '8050')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+worker_class = 'gthread'
+
+# Load the corpus, cube and indexes once in the master; forked workers share
+# those pages copy-on-write instead of each parsing the data again
+preload_app = True
+
+# A slow callback should not hold a worker forever, and recycling workers
+# caps per-worker memory growth (they re-fork from the preloaded master)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+max_requests = 1000
+max_requests_jitter = 100
+
+accesslog = '-'
+errorlog = '-'
+
+
+# Move everything loaded so far out of the GC's reach, so collections in
+# the workers do not write to (and un-share) the preloaded pages
+def when_ready(server):
+    gc.freeze()
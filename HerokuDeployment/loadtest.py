@@ -0,0 +1,182 @@
+### Load test for the dashboard's callbacks.
+### Starts gunicorn with each requested worker count, replays randomized
+### callback requests from concurrent clients and reports throughput, e.g.
+###     python loadtest.py --workers 1 2 4 --concurrency 16 --duration 30
+### Use --url to hit an already running server instead.
+
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+username, password = 'questrom', 'ibms'
+
+
+def request(url, path, body=None):
+    headers = {'Authorization': 'Basic ' + base64.b64encode(f'{username}:{password}'.encode()).decode()}
+    data = None
+    if body is not None:
+        data = json.dumps(body).encode()
+        headers['Content-Type'] = 'application/json'
+    req = urllib.request.Request(url + path, data=data, headers=headers)
+    with urllib.request.urlopen(req, timeout=120) as response:
+        return response.read()
+
+
+# Components in the served layout, by id
+def layout_components(node, found):
+    if isinstance(node, dict):
+        props = node.get('props', {})
+        if 'id' in props and isinstance(props['id'], str):
+            found[props['id']] = props
+        for value in props.values():
+            layout_components(value, found)
+    elif isinstance(node, list):
+        for child in node:
+            layout_components(child, found)
+    return found
+
+
+# A plausible value for a callback input, drawn from the component's own props
+def random_value(props, prop, rng):
+    if prop == 'value' and 'options' in props:
+        values = [option['value'] for option in props['options']]
+        if props.get('multi'):
+            choices = [v for v in values if v != 'All']
+            if not choices or rng.random() < 0.3:
+                return props.get('value')
+            return rng.sample(choices, min(len(choices), rng.randint(1, 3)))
+        return rng.choice(values)
+    if prop == 'value' and 'min' in props and 'max' in props:
+        low, high = sorted(rng.sample(range(props['min'], props['max'] + 1), 2))
+        return [low, high]
+    # stores the browser fills in (line-rendered) are set by the time a user filters
+    if prop == 'data' and props.get(prop) is None:
+        return True
+    return props.get(prop)
+
+
+def parse_outputs(output):
+    if output.startswith('..'):
+        specs = output[2:-2].split('...')
+        return [dict(zip(('id', 'property'), spec.rsplit('.', 1))) for spec in specs], True
+    return dict(zip(('id', 'property'), output.rsplit('.', 1))), False
+
+
+# Build a random _dash-update-component payload for one of the app's callbacks
+def callback_payload(callbacks, components, rng):
+    callback = rng.choice(callbacks)
+    outputs, _ = parse_outputs(callback['output'])
+    inputs = [dict(spec, value=random_value(components.get(spec['id'], {}), spec['property'], rng))
+              for spec in callback['inputs']]
+    state = [dict(spec, value=components.get(spec['id'], {}).get(spec['property']))
+             for spec in callback.get('state', [])]
+    return {
+        'output': callback['output'],
+        'outputs': outputs,
+        'inputs': inputs,
+        'state': state,
+        'changedPropIds': [f"{inputs[0]['id']}.{inputs[0]['property']}"] if inputs else [],
+    }
+
+
+def run_load(url, concurrency, duration, seed):
+    callbacks = [cb for cb in json.loads(request(url, '/_dash-dependencies')) if not cb.get('clientside_function')]
+    components = layout_components(json.loads(request(url, '/_dash-layout')), {})
+    deadline = time.time() + duration
+
+    def client(index):
+        rng = random.Random(seed + index)
+        latencies, errors = [], 0
+        while time.time() < deadline:
+            body = callback_payload(callbacks, components, rng)
+            start = time.perf_counter()
+            try:
+                request(url, '/_dash-update-component', body)
+            except (urllib.error.URLError, OSError):
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+        return latencies, errors
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    elapsed = time.time() - started
+    latencies = sorted(l for lat, _ in results for l in lat)
+    errors = sum(e for _, e in results)
+    if not latencies:
+        return {'requests': 0, 'errors': errors}
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(quantiles[49] * 1000, 1),
+        'p95_ms': round(quantiles[94] * 1000, 1),
+        'p99_ms': round(quantiles[98] * 1000, 1),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, proc, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            request(url, '/_dash-layout')
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    raise RuntimeError(f'server not up after {timeout}s')
+
+
+# Start gunicorn with n workers, run the load against it, then shut it down
+def run_with_workers(n, args):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(n))
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:server', '--config', 'gunicorn.conf.py',
+                             '--access-logfile', '/dev/null'], env=env)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(url, proc, args.startup_timeout)
+        result = run_load(url, args.concurrency, args.duration, args.seed)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return dict(workers=n, **result)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Throughput of the dashboard callbacks per gunicorn worker count')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--startup-timeout', type=float, default=300)
+    parser.add_argument('--url', help='load an already running server instead of starting gunicorn')
+    args = parser.parse_args()
+
+    if args.url:
+        print(json.dumps(run_load(args.url.rstrip('/'), args.concurrency, args.duration, args.seed)))
+    else:
+        results = [run_with_workers(n, args) for n in args.workers]
+        base = results[0].get('throughput_rps') or 1
+        for result in results:
+            result['speedup'] = round(result.get('throughput_rps', 0) / base, 2)
+            print(json.dumps(result))
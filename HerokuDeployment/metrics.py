@@ -0,0 +1,155 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Per-request timings of the dashboard callback, by output (chart) and stage:
+#   filter     - selecting rows/cube cells for the filters
+#   aggregate  - grouping the selection into what the chart plots
+#   figure     - building the plotly figure
+#   serialize  - JSON encoding for the response and the figure cache
+# Stages shared by every chart are recorded under the output 'shared'.
+# Exposed in Prometheus text format on /metrics. Every worker process keeps
+# its own counters, so scrape each worker (or run one worker) for totals.
+# METRICS_LOG=1 also writes one JSON line per request to stderr, and
+# METRICS_TRACE_MEMORY=1 records peak Python allocations per stage
+# (tracemalloc; slows requests down and overlaps between concurrent threads).
+
+log_requests = os.environ.get('METRICS_LOG') == '1'
+trace_memory = os.environ.get('METRICS_TRACE_MEMORY') == '1'
+
+buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+lock = threading.Lock()
+current = threading.local()
+stage_seconds = {}
+stage_peak_bytes = {}
+callback_seconds = {}
+gauges = {}
+
+if trace_memory:
+    tracemalloc.start()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def observe(table, labels, value):
+    with lock:
+        if labels not in table:
+            table[labels] = Histogram()
+        table[labels].observe(value)
+
+
+# Time one stage of one output; nested under track_request() it is also added to
+# that request's record
+@contextmanager
+def timed(output, stage):
+    if trace_memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe(stage_seconds, (output, stage), elapsed)
+        record = getattr(current, 'record', None)
+        if record is not None:
+            timings = record['outputs'].setdefault(output, {})
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            with lock:
+                previous = stage_peak_bytes.get((output, stage), 0)
+                stage_peak_bytes[(output, stage)] = max(previous, peak)
+            if record is not None:
+                record['outputs'][output][stage + '_peak_bytes'] = peak
+
+
+# Wrap one callback invocation; cache is set to 'hit' or 'miss' by the caller
+@contextmanager
+def track_request(callback, inputs=None):
+    record = {'callback': callback, 'inputs': inputs, 'cache': None, 'outputs': {}}
+    current.record = record
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        current.record = None
+        record['seconds'] = time.perf_counter() - start
+        observe(callback_seconds, (callback, record['cache'] or 'none'), record['seconds'])
+        if log_requests:
+            print(json.dumps(record, default=str), file=sys.stderr, flush=True)
+
+
+# Values read at scrape time, e.g. figure cache statistics
+def register_gauge(name, help_text, read):
+    gauges[name] = (help_text, read)
+
+
+def label_text(names, values, extra=''):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}'
+
+
+def histogram_lines(name, help_text, table, label_names):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels, histogram in sorted(table.items()):
+        for bound, count in zip(buckets + ['+Inf'], histogram.counts + [histogram.count]):
+            le = f'le="{bound}"'
+            lines.append(f'{name}_bucket{label_text(label_names, labels, le)} {count}')
+        lines.append(f'{name}_sum{label_text(label_names, labels)} {histogram.sum:.6f}')
+        lines.append(f'{name}_count{label_text(label_names, labels)} {histogram.count}')
+    return lines
+
+
+# Current resident set size of this process, where /proc is available
+def resident_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def render():
+    with lock:
+        lines = histogram_lines('dashboard_stage_seconds', 'Time per callback output and stage.',
+                                stage_seconds, ['output', 'stage'])
+        lines += histogram_lines('dashboard_callback_seconds', 'Time per callback invocation.',
+                                 callback_seconds, ['callback', 'cache'])
+        if stage_peak_bytes:
+            lines += ['# HELP dashboard_stage_peak_bytes Largest peak Python allocation per output and stage.',
+                      '# TYPE dashboard_stage_peak_bytes gauge']
+            lines += [f'dashboard_stage_peak_bytes{label_text(["output", "stage"], labels)} {peak}'
+                      for labels, peak in sorted(stage_peak_bytes.items())]
+    for name, (help_text, read) in sorted(gauges.items()):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {read()}']
+    rss = resident_bytes()
+    if rss is not None:
+        lines += ['# HELP process_resident_memory_bytes Resident memory size in bytes.',
+                  '# TYPE process_resident_memory_bytes gauge', f'process_resident_memory_bytes {rss}']
+    return '\n'.join(lines) + '\n'
+
+
+# Serve render() on /metrics of the Flask server
+def add_route(server, path='/metrics'):
+    @server.route(path)
+    def metrics_endpoint():
+        return render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
@@ -0,0 +1,152 @@
+import numpy as np
+import plotly.graph_objects as go
+
+# Animated Positive x Negative scatter per keyword, one frame per year.
+# The points are grouped by year once (at startup for the unfiltered corpus)
+# and each request only slices the years it shows. With density_bins > 0
+# every frame is a density_bins x density_bins heatmap of counts instead of
+# one marker per document, which keeps the payload fixed-size.
+# Otherwise decimate() caps the markers shipped per figure, and figures with
+# many markers are drawn with WebGL (Scattergl) instead of SVG.
+
+marker_color = '#636efa'
+animation = {'mode': 'immediate', 'fromcurrent': True}
+
+
+# Sort the rows' points by year; frame i holds x/y[bounds[i]:bounds[i + 1]]
+def year_points(arrays, rows, density_bins=0):
+    year = arrays['Year'][rows]
+    keep = ~np.isnan(year) if year.dtype.kind == 'f' else slice(None)
+    rows, year = rows[keep], year[keep]
+    order = np.argsort(year, kind='stable')
+    rows, year = rows[order], year[order]
+    years, starts = np.unique(year, return_index=True)
+    points = {
+        'years': years,
+        'bounds': np.append(starts, len(rows)),
+        'x': arrays['Negative'][rows],
+        'y': arrays['Positive'][rows],
+    }
+    if density_bins:
+        points['counts'] = density_counts(points, density_bins)
+    return points
+
+
+# Per-year 2D histogram of the points over [0, 1] x [0, 1], shape (years, y, x)
+def density_counts(points, bins):
+    frame = np.repeat(np.arange(len(points['years'])), np.diff(points['bounds']))
+    x_bin = np.clip((np.nan_to_num(points['x']) * bins).astype(np.intp), 0, bins - 1)
+    y_bin = np.clip((np.nan_to_num(points['y']) * bins).astype(np.intp), 0, bins - 1)
+    cell = (frame * bins + y_bin) * bins + x_bin
+    return np.bincount(cell, minlength=len(points['years']) * bins * bins).astype(np.int32).reshape(-1, bins, bins)
+
+
+# The years inside the selected range, without copying the points
+def slice_years(points, selected_years):
+    first = np.searchsorted(points['years'], selected_years[0], side='left')
+    last = np.searchsorted(points['years'], selected_years[1], side='right')
+    sliced = {'years': points['years'][first:last], 'bounds': points['bounds'][first:last + 1],
+              'x': points['x'], 'y': points['y']}
+    if 'counts' in points:
+        sliced['counts'] = points['counts'][first:last]
+    return sliced
+
+
+# Markers each year keeps so the total is at most max_points: every non-empty
+# year keeps at least one (when there are fewer years than max_points) and
+# the rest is shared in proportion to the year's size (largest remainder)
+def stratified_quotas(counts, max_points):
+    if counts.sum() <= max_points:
+        return counts
+    base = np.minimum(counts, 1) if np.count_nonzero(counts) <= max_points else np.zeros_like(counts)
+    extra = counts - base
+    share = extra * ((max_points - base.sum()) / extra.sum())
+    quotas = np.floor(share).astype(counts.dtype)
+    leftover = max_points - base.sum() - quotas.sum()
+    quotas[np.argsort(quotas - share, kind='stable')[:leftover]] += 1
+    return base + quotas
+
+
+# Evenly spaced sample of each year's points, at most max_points in total.
+# Deterministic, so cached and recomputed figures agree.
+def decimate(points, max_points):
+    counts = np.diff(points['bounds'])
+    if not max_points or counts.sum() <= max_points:
+        return points
+    quotas = stratified_quotas(counts, max_points)
+    keep = np.concatenate([start + np.linspace(0, count - 1, quota).round().astype(np.intp)
+                           for start, count, quota in zip(points['bounds'][:-1], counts, quotas)])
+    return {'years': points['years'], 'bounds': np.append(0, np.cumsum(quotas)),
+            'x': points['x'][keep], 'y': points['y'][keep]}
+
+
+def point_count(points):
+    return int(points['bounds'][-1] - points['bounds'][0]) if len(points['years']) else 0
+
+
+def point_trace(points, i, keyword, year, webgl=False):
+    start, stop = points['bounds'][i], points['bounds'][i + 1]
+    trace = dict(
+        x=points['x'][start:stop], y=points['y'][start:stop],
+        mode='markers', name=keyword, legendgroup=keyword, showlegend=True,
+        marker={'color': marker_color, 'symbol': 'circle'},
+        hovertemplate=f'Keyword={keyword}<br>Year={year}<br>Negative Sentiment=%{{x}}<br>Positive Sentiment=%{{y}}<extra></extra>',
+    )
+    if webgl:
+        return go.Scattergl(**trace)
+    return go.Scatter(orientation='v', **trace)
+
+
+def density_trace(points, i, keyword, year, zmax):
+    bins = points['counts'].shape[-1]
+    centers = (np.arange(bins) + 0.5) / bins
+    return go.Heatmap(
+        z=points['counts'][i], x=centers, y=centers, zmin=0, zmax=zmax,
+        coloraxis='coloraxis', name=keyword,
+        hovertemplate=f'Keyword={keyword}<br>Year={year}<br>Negative Sentiment=%{{x:.2f}}<br>Positive Sentiment=%{{y:.2f}}<br>Documents=%{{z}}<extra></extra>',
+    )
+
+
+# Same layout as px.scatter(..., animation_frame='Year', color='Keyword').
+# Above webgl_points markers the frames use Scattergl.
+def animated_scatter(points, keyword, title, webgl_points=None):
+    density = 'counts' in points
+    webgl = not density and webgl_points is not None and point_count(points) > webgl_points
+    # heatmaps and WebGL traces cannot be tweened, so their frames redraw
+    redraw = density or webgl
+    frame_args = dict(animation, frame={'duration': 0, 'redraw': redraw}, transition={'duration': 0, 'easing': 'linear'})
+    play_args = dict(animation, frame={'duration': 500, 'redraw': redraw}, transition={'duration': 500, 'easing': 'linear'})
+    if density:
+        zmax = int(points['counts'].max()) if len(points['counts']) else 1
+        traces = [density_trace(points, i, keyword, year, zmax) for i, year in enumerate(points['years'].tolist())]
+    else:
+        traces = [point_trace(points, i, keyword, year, webgl) for i, year in enumerate(points['years'].tolist())]
+    names = [str(year) for year in points['years'].tolist()]
+
+    fig = go.Figure(
+        data=traces[:1],
+        frames=[go.Frame(data=[trace], name=name) for trace, name in zip(traces, names)],
+        layout={
+            'title': {'text': title},
+            'xaxis': {'title': {'text': 'Negative Sentiment'}, 'anchor': 'y', 'domain': [0.0, 1.0]},
+            'yaxis': {'title': {'text': 'Positive Sentiment'}, 'anchor': 'x', 'domain': [0.0, 1.0]},
+            'legend': {'title': {'text': 'Keyword'}, 'tracegroupgap': 0},
+        },
+    )
+    if density:
+        fig.update_layout(coloraxis={'colorscale': 'Blues', 'colorbar': {'title': {'text': 'Documents'}}})
+    if names:
+        fig.update_layout(
+            updatemenus=[{
+                'buttons': [{'args': [None, play_args], 'label': '&#9654;', 'method': 'animate'},
+                            {'args': [[None], frame_args], 'label': '&#9724;', 'method': 'animate'}],
+                'direction': 'left', 'pad': {'r': 10, 't': 70}, 'showactive': False, 'type': 'buttons',
+                'x': 0.1, 'xanchor': 'right', 'y': 0, 'yanchor': 'top',
+            }],
+            sliders=[{
+                'active': 0, 'currentvalue': {'prefix': 'Year='}, 'len': 0.9, 'pad': {'b': 10, 't': 60},
+                'steps': [{'args': [[name], frame_args], 'label': name, 'method': 'animate'} for name in names],
+                'x': 0.1, 'xanchor': 'left', 'y': 0, 'yanchor': 'top',
+            }],
+        )
+    return fig
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: no per-process rusage
+    resource = None
+
+# Benchmark harness for the MERGE pipeline. Generates synthetic ProQuest-style
+# exports (citation.csv in METADATA zips; documentmetadata.csv and
+# emotion_docs.csv in new_VDATA zips/folders), runs vismerge.py and
+# metamerge.py against them as separate processes and prints one JSON report
+# with wall time, peak RSS, rows/sec and bytes read for every stage, e.g.
+#     python benchmerge.py --archives 40 --rows-per-archive 5000 --workers 4
+# Every dataset written is then loaded through the dashboard's load_corpus()
+# to check it is readable there.
+
+here = os.path.dirname(os.path.abspath(__file__))
+dashboard_path = os.path.join(os.path.dirname(here), 'DASHBOARD')
+keywords = ['Capitalism', 'Communism', 'Socialism', 'Fascism']
+source_types = ['Newspapers', 'Magazines', 'Scholarly Journals', 'Blogs, Podcasts, & Websites']
+emotions = ['Anger', 'Disgust', 'Fear', 'Sadness', 'Happiness', 'Love', 'Surprise', 'Neutral', 'Other']
+
+def synthetic_frames(rng, first_id, rows):
+    ids = np.arange(first_id, first_id + rows)
+    years = rng.integers(1900, 2024, rows)
+    dates = [f'{year}-{month:02d}-{day:02d}' for year, month, day in zip(years, rng.integers(1, 13, rows), rng.integers(1, 29, rows))]
+    # like the real exports, a few dates do not parse
+    for i in np.flatnonzero(rng.random(rows) < 0.01):
+        dates[i] = 'n.d.'
+    titles = [f'Document {i}' for i in ids]
+    publications = [f'Publication {p}' for p in rng.integers(0, 500, rows)]
+    citation = pd.DataFrame({
+        'GOID': ids, 'Title': titles, 'Date': dates,
+        'Source Type': rng.choice(source_types, rows), 'Publication Title': publications,
+        'Abstract': ['Lorem ipsum dolor sit amet ' * 4] * rows,
+    })
+    metadata = pd.DataFrame({'ID': ids, 'Title': titles, 'Publication': publications, 'Date': dates})
+    scores = rng.dirichlet(np.ones(len(emotions)), rows)
+    emotion_docs = pd.DataFrame({'ID': ids, **{emotion: scores[:, i] for i, emotion in enumerate(emotions)}})
+    return citation, metadata, emotion_docs
+
+# write the METADATA and new_VDATA folders; every folders_every-th vis archive
+# is an extracted folder instead of a zip, like the real exports
+def generate(root, archives, rows_per_archive, seed, folders_every=4):
+    rng = np.random.default_rng(seed)
+    metadata_path = os.path.join(root, 'METADATA')
+    visdata_path = os.path.join(root, 'DATA', 'new_VDATA')
+    os.makedirs(metadata_path)
+    os.makedirs(visdata_path)
+    for a in range(archives):
+        keyword = keywords[a % len(keywords)]
+        name = f'{keyword}-{a:04d}'
+        citation, metadata, emotion_docs = synthetic_frames(rng, a * rows_per_archive, rows_per_archive)
+        with zipfile.ZipFile(os.path.join(metadata_path, name + '.zip'), 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+            zip_ref.writestr(f'{name}/citation.csv', citation.to_csv(index=False))
+        if folders_every and a % folders_every == folders_every - 1:
+            folder = os.path.join(visdata_path, name)
+            os.makedirs(folder)
+            metadata.to_csv(os.path.join(folder, 'documentmetadata.csv'), index=False)
+            emotion_docs.to_csv(os.path.join(folder, 'emotion_docs.csv'), index=False)
+        else:
+            with zipfile.ZipFile(os.path.join(visdata_path, name + '.zip'), 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+                zip_ref.writestr(f'{name}/documentmetadata.csv', metadata.to_csv(index=False))
+                zip_ref.writestr(f'{name}/emotion_docs.csv', emotion_docs.to_csv(index=False))
+    return metadata_path, visdata_path
+
+def tree_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, file)) for root, dirs, files in os.walk(path) for file in files)
+
+# I/O counters of a process from /proc (Linux); a process's counters include
+# those of the children it has reaped, e.g. vismerge's worker pool
+def proc_io(pid):
+    try:
+        with open(f'/proc/{pid}/io') as f:
+            return {key: int(value) for key, value in (line.split(': ') for line in f.read().splitlines())}
+    except (OSError, ValueError):
+        return None
+
+# rows in a merged dataset, from the _stats.json its writer leaves
+def dataset_rows(dataset_path):
+    with open(os.path.join(dataset_path, '_stats.json')) as f:
+        return json.load(f)['rows']
+
+# run a child process to completion: exit code, rusage, /proc io counters, wall time
+def run_child(command):
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=here, stdout=subprocess.DEVNULL)
+    io = None
+    if resource is not None:
+        # wait for the exit without reaping, so /proc/<pid>/io is still there
+        if hasattr(os, 'waitid'):
+            os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+            io = proc_io(proc.pid)
+        _, status, usage = os.wait4(proc.pid, 0)
+        returncode = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') else status
+        proc.returncode = returncode
+    else:
+        returncode, usage = proc.wait(), None
+    return returncode, usage, io, time.perf_counter() - start
+
+# bytes a bare interpreter reads loading the pipeline's modules, subtracted
+# from every stage's bytes_read
+def startup_bytes_read():
+    _, _, io, _ = run_child([sys.executable, '-c', 'import pandas, pyarrow.dataset, pyarrow.parquet'])
+    return io['rchar'] if io else 0
+
+# run one pipeline script as a child process and measure it
+def run_stage(name, script, args, output_path, input_paths, startup_bytes=0):
+    command = [sys.executable, os.path.join(here, script)] + args
+    returncode, usage, io, wall = run_child(command)
+    if returncode != 0:
+        raise RuntimeError(f"{name} failed with exit code {returncode}: {' '.join(command)}")
+    rows = dataset_rows(output_path)
+    bytes_read = max(0, io['rchar'] - startup_bytes) if io else None
+    if io is not None:
+        disk_read_bytes = io['read_bytes']
+    else:
+        disk_read_bytes = usage.ru_inblock * 512 if usage else None
+    return {
+        'stage': name,
+        'wall_s': round(wall, 3),
+        # ru_maxrss is KiB on Linux; it covers the stage's worker processes too
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1) if usage else None,
+        # rows in the dataset the stage wrote
+        'rows': rows,
+        'rows_per_s': round(rows / wall, 1) if wall else None,
+        # size of the stage's inputs on disk, whether it read them or not
+        'input_size_bytes': sum(tree_size(path) for path in input_paths),
+        # bytes the stage read through read() calls, page cache included,
+        # less what loading Python and its modules takes
+        'bytes_read': bytes_read,
+        'read_mb_per_s': round(bytes_read / wall / 2**20, 2) if bytes_read is not None and wall else None,
+        # bytes actually fetched from disk (0 when everything was in the page cache)
+        'disk_read_bytes': disk_read_bytes,
+    }
+
+# load a merged dataset the way the dashboard does and check every row arrives
+def check_dashboard_load(name, dataset_path, cache_path):
+    if dashboard_path not in sys.path:
+        sys.path.insert(0, dashboard_path)
+    import corpus
+    corpus.cache_folder_path = cache_path
+    with open(os.path.join(dataset_path, '_stats.json')) as f:
+        expected = json.load(f)['rows']
+    start = time.perf_counter()
+    df, _ = corpus.load_corpus(dataset_path)
+    wall = time.perf_counter() - start
+    if len(df) != expected:
+        raise RuntimeError(f"{name}: load_corpus read {len(df)} of {expected} rows from {dataset_path}")
+    return {'dataset': name, 'wall_s': round(wall, 3), 'rows': len(df), 'rows_without_year': int(df['Year'].isna().sum())}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vismerge.py and metamerge.py on synthetic ProQuest exports')
+    parser.add_argument('--archives', type=int, default=20)
+    parser.add_argument('--rows-per-archive', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=1, help='passed to vismerge.py --workers')
+    parser.add_argument('--max-memory-mb', type=int, help='also benchmark metamerge.py --max-memory-mb')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help='where to generate data (default: a temporary folder)')
+    parser.add_argument('--keep', action='store_true', help='keep the generated data and outputs')
+    parser.add_argument('--report', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    root = args.workdir or tempfile.mkdtemp(prefix='benchmerge-')
+    try:
+        start = time.perf_counter()
+        metadata_path, visdata_path = generate(root, args.archives, args.rows_per_archive, args.seed)
+        generate_s = time.perf_counter() - start
+        data_path = os.path.join(root, 'DATA')
+        vis_output = os.path.join(data_path, 'merged_output.csv')
+        final_output = os.path.join(data_path, 'final_merged_output.xlsx')
+        streamed_output = os.path.join(data_path, 'final_streamed.xlsx')
+        vis_dataset, final_dataset, streamed_dataset = (os.path.splitext(path)[0] for path in (vis_output, final_output, streamed_output))
+
+        startup_bytes = startup_bytes_read()
+        stages = [
+            run_stage('vismerge', 'vismerge.py',
+                      ['--input', visdata_path, '--output', vis_output, '--workers', str(args.workers), '--full'],
+                      vis_dataset, [visdata_path], startup_bytes),
+            # nothing changed: only the manifest check and the final merge should run
+            run_stage('vismerge_incremental', 'vismerge.py',
+                      ['--input', visdata_path, '--output', vis_output, '--workers', str(args.workers)],
+                      vis_dataset, [visdata_path], startup_bytes),
+            run_stage('metamerge', 'metamerge.py',
+                      ['--input', metadata_path, '--additional', vis_dataset, '--output', final_output, '--full'],
+                      final_dataset, [metadata_path, vis_dataset], startup_bytes),
+        ]
+        if args.max_memory_mb:
+            stages.append(run_stage('metamerge_streaming', 'metamerge.py',
+                                    ['--input', metadata_path, '--additional', vis_dataset,
+                                     '--output', streamed_output, '--max-memory-mb', str(args.max_memory_mb)],
+                                    streamed_dataset, [metadata_path, vis_dataset], startup_bytes))
+
+        datasets = [('vismerge', vis_dataset), ('metamerge', final_dataset)]
+        if args.max_memory_mb:
+            datasets.append(('metamerge_streaming', streamed_dataset))
+        cache_path = os.path.join(root, 'cache')
+        dashboard_load = [check_dashboard_load(name, path, cache_path) for name, path in datasets]
+
+        report = {
+            'archives': args.archives,
+            'rows_per_archive': args.rows_per_archive,
+            'workers': args.workers,
+            'generate_s': round(generate_s, 3),
+            'startup_bytes_read': startup_bytes,
+            'python': sys.version.split()[0],
+            'pandas': pd.__version__,
+            'stages': stages,
+            'dashboard_load': dashboard_load,
+        }
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
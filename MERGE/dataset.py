@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Merged corpora are written as a Parquet dataset partitioned by Keyword and
+# publication year, so readers (the dashboards) can load only the keywords,
+# years and columns they need. Every file carries Parquet column statistics
+# (min/max/null count per row group); _stats.json summarises row counts per
+# partition and per-column ranges.
+
+partition_columns = ['Keyword', 'Year']
+stats_file_name = '_stats.json'
+
+# explicit partition types: inferred ones come back as dictionaries, which
+# pyarrow cannot unify once a row without a parseable date lands in the null
+# (__HIVE_DEFAULT_PARTITION__) Year
+partitioning = ds.partitioning(pa.schema([('Keyword', pa.string()), ('Year', pa.int32())]), flavor='hive')
+
+# dataset folder written in place of a single CSV/XLSX output file
+def dataset_path_for(output_file):
+    return os.path.splitext(output_file)[0]
+
+# fold one chunk's null counts and min/max into the running column stats
+def update_column_stats(stats, df):
+    for col in df.columns:
+        entry = stats.setdefault(col, {'nulls': 0})
+        nulls = int(df[col].isna().sum())
+        entry['nulls'] += nulls
+        if pd.api.types.is_numeric_dtype(df[col]) and nulls < len(df):
+            low, high = df[col].min(), df[col].max()
+            entry['min'] = low if 'min' not in entry else min(entry['min'], low)
+            entry['max'] = high if 'max' not in entry else max(entry['max'], high)
+    return stats
+
+# Writes a dataset one or more chunks at a time into a temporary folder and
+# swaps it into place on close(), so memory stays bounded by the chunk size.
+# Every flush writes one file per (Keyword, Year), so small chunks are held
+# (as Arrow tables) until buffer_rows rows are pending rather than each
+# becoming a file in every partition.
+class DatasetWriter:
+    def __init__(self, dataset_path, date_column, buffer_rows=0):
+        # only ever replace a folder this writer created before
+        if os.path.exists(dataset_path) and not os.path.exists(os.path.join(dataset_path, stats_file_name)):
+            raise FileExistsError(f"{dataset_path} exists and is not a merged dataset; refusing to overwrite it")
+        self.dataset_path = dataset_path
+        self.tmp_path = dataset_path + '.tmp'
+        self.date_column = date_column
+        self.buffer_rows = buffer_rows
+        self.pending = []
+        self.pending_rows = 0
+        self.schema = None
+        self.chunks = 0
+        self.stats = {'rows': 0, 'partitions': {}, 'columns': {}}
+        if os.path.exists(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+
+    def write(self, df):
+        df = df.copy()
+        df['Keyword'] = df['Keyword'].fillna('').astype(str)
+        df['Year'] = pd.to_datetime(df[self.date_column], errors='coerce').dt.year.astype('Int32')
+
+        # ProQuest exports mix numbers and text in some columns; Parquet needs one type
+        for col in df.columns:
+            if df[col].dtype == object and col not in partition_columns:
+                df[col] = df[col].astype('string')
+
+        # pandas metadata is dropped so the partition columns read back as plain
+        # dictionary columns rather than failing to map onto nullable dtypes.
+        # The first chunk fixes the schema (all-null columns become strings)
+        # so every file in the dataset agrees.
+        if self.schema is None:
+            schema = pa.Schema.from_pandas(df, preserve_index=False).remove_metadata()
+            self.schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in schema])
+        self.pending.append(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False).replace_schema_metadata(None))
+        self.pending_rows += len(df)
+        if self.pending_rows >= self.buffer_rows:
+            self.flush()
+
+        self.stats['rows'] += len(df)
+        for (keyword, year), count in df.groupby(partition_columns, dropna=False).size().items():
+            key = f'Keyword={keyword}/Year={year}'
+            self.stats['partitions'][key] = self.stats['partitions'].get(key, 0) + int(count)
+        update_column_stats(self.stats['columns'], df)
+
+    def flush(self):
+        if not self.pending:
+            return
+        table = pa.concat_tables(self.pending)
+        self.pending, self.pending_rows = [], 0
+        pq.write_to_dataset(table, self.tmp_path, partition_cols=partition_columns,
+                            basename_template=f'part-{self.chunks}-{{i}}.parquet')
+        self.chunks += 1
+
+    def close(self):
+        self.flush()
+        os.makedirs(self.tmp_path, exist_ok=True)
+        with open(os.path.join(self.tmp_path, stats_file_name), 'w') as f:
+            json.dump(self.stats, f, indent=2, default=lambda value: value.item() if hasattr(value, 'item') else str(value))
+        if os.path.exists(self.dataset_path):
+            shutil.rmtree(self.dataset_path)
+        os.replace(self.tmp_path, self.dataset_path)
+
+def write_partitioned(df, dataset_path, date_column):
+    writer = DatasetWriter(dataset_path, date_column)
+    writer.write(df)
+    writer.close()
+
+def open_dataset(path):
+    return ds.dataset(path, format='parquet', partitioning=partitioning)
+
+# undo the partitioning on read: Year is derived, an empty Keyword comes back as null
+def restore_columns(df, columns=None):
+    if columns is None or 'Year' not in columns:
+        df = df.drop(columns=['Year'], errors='ignore')
+    if 'Keyword' in df.columns:
+        df['Keyword'] = df['Keyword'].fillna('').astype(str)
+    return df
+
+# read a merged output back, either a partitioned dataset or a CSV
+def read_table(path, columns=None):
+    if not os.path.isdir(path):
+        return pd.read_csv(path, usecols=columns)
+    return restore_columns(open_dataset(path).to_table(columns=columns).to_pandas(), columns)
+
+# the same, as a stream of DataFrames of at most chunk_rows rows. read_csv
+# infers types per chunk, so pass dtype to keep every chunk alike. A dataset
+# yields at least one batch per file, which are gathered up to chunk_rows.
+def iter_table(path, chunk_rows, dtype=None):
+    if not os.path.isdir(path):
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype=dtype)
+        return
+    batches, rows = [], 0
+    for batch in open_dataset(path).to_batches(batch_size=chunk_rows):
+        if rows + batch.num_rows > chunk_rows and batches:
+            yield restore_columns(pa.Table.from_batches(batches).to_pandas())
+            batches, rows = [], 0
+        batches.append(batch)
+        rows += batch.num_rows
+    if batches:
+        yield restore_columns(pa.Table.from_batches(batches).to_pandas())
+
+# the first rows of a merged output, to estimate its per-row memory cost
+def head_table(path, rows):
+    if not os.path.isdir(path):
+        return pd.read_csv(path, nrows=rows)
+    return restore_columns(open_dataset(path).head(rows).to_pandas())
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import pandas as pd
+
+# Incremental merge manifest shared by metamerge.py and vismerge.py.
+# Every input archive (zip file or folder) gets an entry with its size, mtime,
+# content hash, row counts and the partition files holding its parsed rows.
+# A re-run only parses archives whose fingerprint changed and reloads the
+# partitions of the rest.
+
+# manifest and partition folder live next to the merged output
+def manifest_paths(output_file):
+    base = os.path.splitext(output_file)[0]
+    return base + '.manifest.json', base + '.parts'
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'archives': {}}
+
+def save_manifest(manifest_path, manifest):
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+# files making up an archive: the zip itself, or everything under a folder
+def archive_files(path):
+    if os.path.isdir(path):
+        return sorted(os.path.join(root, file) for root, dirs, files in os.walk(path) for file in files)
+    return [path]
+
+def content_hash(path):
+    sha = hashlib.sha256()
+    for file in archive_files(path):
+        sha.update(os.path.relpath(file, path).encode())
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+# size/mtime are checked first; the hash is only recomputed when they moved,
+# so a touched-but-identical archive is still recognised as unchanged
+def archive_fingerprint(path, previous=None):
+    stats = [os.stat(file) for file in archive_files(path)]
+    fingerprint = {'size': sum(s.st_size for s in stats), 'mtime_ns': max((s.st_mtime_ns for s in stats), default=0)}
+    if previous and previous.get('size') == fingerprint['size'] and previous.get('mtime_ns') == fingerprint['mtime_ns']:
+        fingerprint['sha256'] = previous.get('sha256')
+    else:
+        fingerprint['sha256'] = content_hash(path)
+    return fingerprint
+
+def partitions_exist(entry, parts_dir):
+    return all(os.path.exists(os.path.join(parts_dir, file)) for file in entry.get('partitions', {}).values())
+
+# split archives into those whose partitions can be reused and those to parse
+def plan_archives(manifest, item_paths, parts_dir, full=False):
+    fingerprints, todo = {}, []
+    for path in item_paths:
+        name = os.path.basename(os.path.normpath(path))
+        previous = manifest['archives'].get(name)
+        fingerprint = archive_fingerprint(path, previous)
+        fingerprints[name] = fingerprint
+        if (full or previous is None or previous.get('sha256') != fingerprint['sha256']
+                or previous.get('size') != fingerprint['size'] or not partitions_exist(previous, parts_dir)):
+            todo.append(path)
+        else:
+            # same content, possibly a new mtime: remember it to skip the hash next time
+            previous.update(fingerprint)
+    return fingerprints, todo
+
+def remove_partitions(entry, parts_dir):
+    for file in entry.get('partitions', {}).values():
+        path = os.path.join(parts_dir, file)
+        if os.path.exists(path):
+            os.remove(path)
+
+# Parquet needs one type per column; read_csv can leave numbers and text
+# mixed in an object column, so those values are stored as text
+def storable(df):
+    mixed = [col for col in df.columns if df[col].dtype == object
+             and pd.api.types.infer_dtype(df[col], skipna=True) not in ('string', 'empty')]
+    if not mixed:
+        return df
+    df = df.copy()
+    for col in mixed:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+# store an archive's parsed frames (label -> list of frames) as one Parquet
+# partition per label (not pickles, which only load under the pandas that wrote them)
+def record_archive(manifest, name, fingerprint, frames_by_label, parts_dir):
+    os.makedirs(parts_dir, exist_ok=True)
+    previous = manifest['archives'].get(name)
+    if previous:
+        remove_partitions(previous, parts_dir)
+    entry = dict(fingerprint, rows={}, partitions={})
+    for label, frames in frames_by_label.items():
+        if not frames:
+            continue
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        file = f'{name}.{label}.parquet'
+        storable(df).to_parquet(os.path.join(parts_dir, file), index=False)
+        entry['rows'][label] = len(df)
+        entry['partitions'][label] = file
+    manifest['archives'][name] = entry
+
+# reload an unchanged archive's frames from its partitions; None when they
+# cannot be read (e.g. pickles from an older run), so the caller re-parses it
+def load_archive(manifest, name, parts_dir, labels):
+    partitions = manifest['archives'][name].get('partitions', {})
+    try:
+        return {label: [pd.read_parquet(os.path.join(parts_dir, partitions[label]))] if label in partitions else []
+                for label in labels}
+    except (ImportError, OSError, ValueError) as e:
+        print(f"Partitions of {name} unreadable ({e}); re-parsing it")
+        return None
+
+# forget archives that are no longer in the input folder
+def prune_archives(manifest, names, parts_dir):
+    for name in set(manifest['archives']) - set(names):
+        remove_partitions(manifest['archives'].pop(name), parts_dir)
@@ -1,76 +1,173 @@
+import argparse
 import os
 import zipfile
 import pandas as pd
 
+from dataset import DatasetWriter, dataset_path_for, head_table, iter_table, read_table, write_partitioned
+from manifest import load_archive, load_manifest, manifest_paths, plan_archives, prune_archives, record_archive, save_manifest
+
 # Define the folder containing the zipped folders
 zip_folder_path = r'C:\\Users\\mamar\\Questrom Sentiment Project\\METADATA'
-output_folder_path = r'C:\\Users\\mamar\\Questrom Sentiment Project\\DATA\\temp_extracted\\'
 final_output_file = r'C:\\Users\\mamar\\Questrom Sentiment Project\\DATA\\final_merged_output.xlsx'
 additional_csv_file = r'C:\\Users\\mamar\\Questrom Sentiment Project\\DATA\\merged_output.csv'
 
-# Ensure the output folder exists
-if not os.path.exists(output_folder_path):
-    os.makedirs(output_folder_path)
-
 # Define the name of the Excel file to be merged
 excel_file_name = 'citation.csv'
 shared_column_excel = 'GOID'  # Column name in the Excel files
 shared_column_csv = 'ID'  # Column name in the additional CSV file
 
-# Function to extract specific file from zip
-def extract_specific_file(zip_path, output_path, file_name):
+# Specify the columns to drop from the final merged DataFrame
+columns_to_drop = ['ID', 'Title_y', 'Publication', 'Date_y']
+
+# Dataset output keeps the citation date under the name the dashboard reads
+dataset_columns = {'Date_x': 'Date'}
+
+# Read every copy of file_name inside the zip straight from the archive,
+# without extracting anything to disk
+def read_specific_files(zip_path, file_name):
+    frames = []
     with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        for file in zip_ref.namelist():
-            if file.endswith(file_name):
-                zip_ref.extract(file, output_path)
-
-# Initialize DataFrame to None
-merged_excel_df = pd.DataFrame()
-
-# Extract the specific Excel file from each zipped folder and read into DataFrame
-zip_files = [f for f in os.listdir(zip_folder_path) if f.endswith('.zip')]
-
-for idx, zip_filename in enumerate(zip_files):
-    zip_file_path = os.path.join(zip_folder_path, zip_filename)
-    extract_specific_file(zip_file_path, output_folder_path, excel_file_name)
-    
-    # Read the extracted Excel file into DataFrame
-    for root, dirs, files in os.walk(output_folder_path):
-        for file in files:
-            if file == excel_file_name:
-                temp_df = pd.read_csv(os.path.join(root, file))
-                if merged_excel_df.empty:
-                    merged_excel_df = temp_df
-                else:
-                    merged_excel_df = pd.merge(merged_excel_df, temp_df, on=shared_column_excel, how='outer')
-
-    # Clean up extracted files
-    for file in files:
-        os.remove(os.path.join(root, file))
-
-    # Provide progress feedback
-    print(f"Processed {idx + 1}/{len(zip_files)}: {zip_filename}")
-
-# Print the columns of the merged Excel DataFrame
-print("Columns in merged Excel DataFrame:", merged_excel_df.columns)
-
-# Perform a full outer join with the additional CSV file
-additional_df = pd.read_csv(additional_csv_file)
-
-# Print the columns of the additional CSV DataFrame
-print("Columns in additional CSV DataFrame:", additional_df.columns)
-
-# Check if the columns exist before merging
-if shared_column_excel in merged_excel_df.columns and shared_column_csv in additional_df.columns:
-    final_merged_df = pd.merge(merged_excel_df, additional_df, left_on=shared_column_excel, right_on=shared_column_csv, how='inner')
-    # Save the final merged DataFrame to an Excel file
-
-     # Specify the columns to drop from the final merged DataFrame
-    columns_to_drop = ['ID', 'Title_y', 'Publication', 'Date_y']  
-    final_merged_df.drop(columns=columns_to_drop, inplace=True)
-
-    # Export file
-    final_merged_df.to_excel(final_output_file, index=False)
-    print(f"Final merged data saved to {final_output_file}")
-else:
-    print(f"Column '{shared_column_excel}' not found in merged Excel DataFrame or column '{shared_column_csv}' not found in additional CSV DataFrame.")
+        for member in zip_ref.namelist():
+            if os.path.basename(member) == file_name:
+                with zip_ref.open(member) as f:
+                    frames.append(pd.read_csv(f))
+    return frames
+
+# Combine every archive's rows in one pass, keyed on the shared column.
+# Overlapping columns are coalesced rather than suffixed: for each key the
+# first archive (in file name order) with a non-null value wins and later
+# archives only fill in gaps. Rows without a key cannot be joined and are dropped.
+def combine_on_key(frames, key):
+    if not frames:
+        return pd.DataFrame()
+    combined = pd.concat(frames, ignore_index=True, sort=False)
+    return combined.groupby(key, sort=False).first().reset_index()
+
+# Fewest rows read per chunk and written per flush, whatever the budget: every
+# flush adds a file to each (Keyword, Year) partition it touches
+min_chunk_rows = 10000
+
+# Types for reading a CSV additional file in chunks, from its first rows: the
+# key and float columns (the emotion scores) keep theirs, everything else is
+# read as text, since ProQuest columns that look numeric early on can hold
+# text further down (e.g. 'A12')
+def pinned_dtypes(sample):
+    return {col: sample[col].dtype if col == shared_column_csv or sample[col].dtype.kind == 'f' else str
+            for col in sample.columns}
+
+# Inner join against an additional file too big for memory: the citation rows
+# are hashed once on GOID, the additional file is streamed in chunks sized to
+# fit max_memory_mb, and the matches are written to dataset_path once a
+# chunk's worth has gathered
+def streaming_join(merged_excel_df, additional_path, dataset_path, max_memory_mb):
+    key_index = pd.Index(merged_excel_df[shared_column_excel])
+    sample = head_table(additional_path, 1000)
+    row_bytes = max(1, sample.memory_usage(deep=True).sum() // max(1, len(sample)))
+    budget = max_memory_mb * 2**20 - merged_excel_df.memory_usage(deep=True).sum()
+
+    # a chunk, its matched rows, the joined result and the writer's buffer are alive at the same time
+    chunk_rows = max(min_chunk_rows, int(budget // (4 * row_bytes)))
+    if chunk_rows == min_chunk_rows:
+        print(f"Warning: {max_memory_mb} MB leaves room for fewer than {min_chunk_rows} rows per chunk; using {min_chunk_rows}")
+    dtype = None if os.path.isdir(additional_path) else pinned_dtypes(sample)
+    writer = DatasetWriter(dataset_path, date_column='Date', buffer_rows=chunk_rows)
+    matched = 0
+    for idx, chunk in enumerate(iter_table(additional_path, chunk_rows, dtype)):
+        positions = key_index.get_indexer(chunk[shared_column_csv])
+        found = positions >= 0
+        if found.any():
+            joined = pd.merge(merged_excel_df.iloc[positions[found]], chunk[found],
+                              left_on=shared_column_excel, right_on=shared_column_csv, how='inner')
+            joined.drop(columns=columns_to_drop, inplace=True)
+            writer.write(joined.rename(columns=dataset_columns))
+            matched += len(joined)
+        print(f"Joined chunk {idx + 1} ({len(chunk)} rows, {chunk_rows} per chunk): {matched} matched so far")
+    writer.close()
+    return matched
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge citation.csv from every archive with the merged emotion CSV')
+    parser.add_argument('--input', default=zip_folder_path, help='folder of zipped ProQuest exports')
+    parser.add_argument('--additional', default=additional_csv_file, help='merged CSV (or vismerge dataset folder) to join on ID')
+    parser.add_argument('--output', default=final_output_file, help='final merged Excel file (with --format parquet, the dataset folder is named after it)')
+    parser.add_argument('--format', choices=['parquet', 'xlsx'], default='parquet', help='Parquet dataset partitioned by Keyword/Year, or one Excel file')
+    parser.add_argument('--full', action='store_true', help='ignore the manifest and re-read every archive')
+    parser.add_argument('--max-memory-mb', type=int, help='stream the join in chunks that fit this memory budget (parquet output only)')
+    args = parser.parse_args()
+    if args.max_memory_mb and args.format != 'parquet':
+        parser.error('--max-memory-mb writes chunks as they are joined and needs --format parquet')
+
+    # Per-archive DataFrames, combined once after the loop
+    excel_frames = []
+
+    # Read the specific Excel file from each zipped folder into DataFrames;
+    # archives unchanged since the last run are reloaded from their partitions
+    zip_files = sorted(f for f in os.listdir(args.input) if f.endswith('.zip'))
+    zip_file_paths = [os.path.join(args.input, f) for f in zip_files]
+    manifest_path, parts_dir = manifest_paths(args.output)
+    manifest = load_manifest(manifest_path)
+    fingerprints, todo = plan_archives(manifest, zip_file_paths, parts_dir, full=args.full)
+    todo = set(todo)
+
+    for idx, (zip_filename, zip_file_path) in enumerate(zip(zip_files, zip_file_paths)):
+        partitions = None
+        if zip_file_path not in todo:
+            partitions = load_archive(manifest, zip_filename, parts_dir, ['citation'])
+        if partitions is not None:
+            frames = partitions['citation']
+            status = 'unchanged'
+        else:
+            # Read the Excel file(s) from the zip into DataFrames
+            frames = read_specific_files(zip_file_path, excel_file_name)
+            record_archive(manifest, zip_filename, fingerprints[zip_filename], {'citation': frames}, parts_dir)
+            status = 'read'
+        excel_frames.extend(frames)
+
+        # Provide progress feedback
+        print(f"Processed {idx + 1}/{len(zip_files)}: {zip_filename} ({status})")
+
+    prune_archives(manifest, zip_files, parts_dir)
+    save_manifest(manifest_path, manifest)
+
+    merged_excel_df = combine_on_key(excel_frames, shared_column_excel)
+
+    # Print the columns of the merged Excel DataFrame
+    print("Columns in merged Excel DataFrame:", merged_excel_df.columns)
+
+    # Stream the join when the additional file does not fit in memory
+    if args.max_memory_mb:
+        sample = head_table(args.additional, 1000)
+        print("Columns in additional CSV DataFrame:", sample.columns)
+        if shared_column_excel in merged_excel_df.columns and shared_column_csv in sample.columns:
+            dataset_path = dataset_path_for(args.output)
+            matched = streaming_join(merged_excel_df, args.additional, dataset_path, args.max_memory_mb)
+            print(f"Final merged data ({matched} rows) saved to {dataset_path}")
+        else:
+            print(f"Column '{shared_column_excel}' not found in merged Excel DataFrame or column '{shared_column_csv}' not found in additional CSV DataFrame.")
+        return
+
+    # Perform a full outer join with the additional CSV file
+    additional_df = read_table(args.additional)
+
+    # Print the columns of the additional CSV DataFrame
+    print("Columns in additional CSV DataFrame:", additional_df.columns)
+
+    # Check if the columns exist before merging
+    if shared_column_excel in merged_excel_df.columns and shared_column_csv in additional_df.columns:
+        final_merged_df = pd.merge(merged_excel_df, additional_df, left_on=shared_column_excel, right_on=shared_column_csv, how='inner')
+        # Save the final merged DataFrame to an Excel file
+        final_merged_df.drop(columns=columns_to_drop, inplace=True)
+
+        # Export file
+        if args.format == 'parquet':
+            dataset_path = dataset_path_for(args.output)
+            write_partitioned(final_merged_df.rename(columns=dataset_columns), dataset_path, date_column='Date')
+            print(f"Final merged data saved to {dataset_path}")
+        else:
+            final_merged_df.to_excel(args.output, index=False)
+            print(f"Final merged data saved to {args.output}")
+    else:
+        print(f"Column '{shared_column_excel}' not found in merged Excel DataFrame or column '{shared_column_csv}' not found in additional CSV DataFrame.")
+
+if __name__ == '__main__':
+    main()
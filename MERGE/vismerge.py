@@ -1,80 +1,141 @@
+import argparse
 import os
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 
+from dataset import dataset_path_for, write_partitioned
+from manifest import load_archive, load_manifest, manifest_paths, plan_archives, prune_archives, record_archive, save_manifest
+
 # file paths
 visdata = r'C:\\Users\\mamar\\Questrom Sentiment Project\\DATA\\new_VDATA\\'
-output_folder_path = r'C:\\Users\\mamar\\Questrom Sentiment Project\\DATA\\new_VDATA\\temp_extracted\\'
 merged_output_file = r'C:\\Users\\mamar\\Questrom Sentiment Project\\DATA\\idk.csv'
 
-if not os.path.exists(output_folder_path):
-    os.makedirs(output_folder_path)
-
 # two CSV files to be merged
 file1_name = 'documentmetadata.csv'
 file2_name = 'emotion_docs.csv'
 shared_column = 'ID'
 
-# extract specific files from zip
-def extract_specific_files(zip_path, output_path, file_names):
+# read the two CSV files straight from a zip, without extracting to disk;
+# frames are only collected here and concatenated once in merge_frames
+def read_zip_files(zip_path, keyword):
+    frames1, frames2 = [], []
     with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        for file in zip_ref.namelist():
-            if any(file.endswith(name) for name in file_names):
-                zip_ref.extract(file, output_path)
+        for member in zip_ref.namelist():
+            name = os.path.basename(member)
+            if name == file1_name:
+                with zip_ref.open(member) as f:
+                    temp_df1 = pd.read_csv(f)
+                temp_df1['Keyword'] = keyword
+                frames1.append(temp_df1)
+            elif name == file2_name:
+                with zip_ref.open(member) as f:
+                    frames2.append(pd.read_csv(f))
+    return frames1, frames2
 
 # process CSV files in a folder
 def process_csv_files_in_folder(folder_path, keyword):
-    global df1, df2
+    frames1, frames2 = [], []
     for root, dirs, files in os.walk(folder_path):
         for file in files:
             if file == file1_name:
                 temp_df1 = pd.read_csv(os.path.join(root, file))
                 temp_df1['Keyword'] = keyword 
-                if df1 is None:
-                    df1 = temp_df1
-                else:
-                    df1 = pd.concat([df1, temp_df1], ignore_index=True)
+                frames1.append(temp_df1)
             elif file == file2_name:
-                temp_df2 = pd.read_csv(os.path.join(root, file))
-                if df2 is None:
-                    df2 = temp_df2
-                else:
-                    df2 = pd.concat([df2, temp_df2], ignore_index=True)
-
-# initialize DataFrames
-df1 = None
-df2 = None
-
-# process both zip files and regular folders
-items = os.listdir(visdata)
-
-for idx, item in enumerate(items):
-    item_path = os.path.join(visdata, item)
-    
+                frames2.append(pd.read_csv(os.path.join(root, file)))
+    return frames1, frames2
+
+# parse one zip file or regular folder into its documentmetadata and emotion_docs frames;
+# archives are independent, so this is what runs in the worker processes
+def process_item(item_path):
+    item = os.path.basename(os.path.normpath(item_path))
+
     # if item is a zip file
     if item.endswith('.zip'):
-        extract_specific_files(item_path, output_folder_path, [file1_name, file2_name])
         keyword = os.path.splitext(item)[0].split('-')[0]
-        process_csv_files_in_folder(output_folder_path, keyword)
+        return read_zip_files(item_path, keyword)
 
-        # clean up extracted files
-        for file in os.listdir(output_folder_path):
-            os.remove(os.path.join(output_folder_path, file))
-        
     # if item is a regular folder
     elif os.path.isdir(item_path):
-        keyword = os.path.basename(item_path).split('-')[0]
-        process_csv_files_in_folder(item_path, keyword)
-    
-    # progress
-    print(f"Processed {idx + 1}/{len(items)}: {item}")
-
-# save merged file
-if df1 is not None and df2 is not None:
+        keyword = item.split('-')[0]
+        return process_csv_files_in_folder(item_path, keyword)
+
+    return [], []
+
+# parse every archive, in parallel when workers > 1; results come back in
+# item order either way, so the merged output does not depend on the pool
+def process_items(item_paths, workers):
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(process_item, item_paths)
+    else:
+        yield from map(process_item, item_paths)
+
+# single reducer: one concat per file type over every archive's frames, then merge on ID
+def merge_frames(results):
+    frames1 = [df for frames1, frames2 in results for df in frames1]
+    frames2 = [df for frames1, frames2 in results for df in frames2]
+    if not frames1 or not frames2:
+        return None
+    df1 = pd.concat(frames1, ignore_index=True)
+    df2 = pd.concat(frames2, ignore_index=True)
     merged_df = pd.merge(df1, df2, on=shared_column)
     merged_df.drop_duplicates(subset=['ID', 'Keyword'], keep='first', inplace=True)
-    
-    merged_df.to_csv(merged_output_file, index=False)
-    print(f"Merged CSV file saved to {merged_output_file}")
-else:
-    print("One or both of the specified files were not found.")
+    return merged_df
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge documentmetadata.csv and emotion_docs.csv from every archive')
+    parser.add_argument('--input', default=visdata, help='folder of zip files and/or extracted folders')
+    parser.add_argument('--output', default=merged_output_file, help='merged CSV file (with --format parquet, the dataset folder is named after it)')
+    parser.add_argument('--format', choices=['parquet', 'csv'], default='parquet', help='Parquet dataset partitioned by Keyword/Year, or one CSV')
+    parser.add_argument('--workers', type=int, default=1, help='number of archives to parse concurrently')
+    parser.add_argument('--full', action='store_true', help='ignore the manifest and re-parse every archive')
+    args = parser.parse_args()
+
+    # process both zip files and regular folders
+    items = sorted(os.listdir(args.input))
+    item_paths = [os.path.join(args.input, item) for item in items]
+
+    # only archives that are new or changed since the last run get parsed
+    manifest_path, parts_dir = manifest_paths(args.output)
+    manifest = load_manifest(manifest_path)
+    fingerprints, todo = plan_archives(manifest, item_paths, parts_dir, full=args.full)
+    parsed = process_items(todo, args.workers)
+    todo = set(todo)
+
+    results = []
+    for idx, (item, item_path) in enumerate(zip(items, item_paths)):
+        frames = None
+        if item_path not in todo:
+            frames = load_archive(manifest, item, parts_dir, ['documentmetadata', 'emotion_docs'])
+        if frames is not None:
+            frames1, frames2 = frames['documentmetadata'], frames['emotion_docs']
+            status = 'unchanged'
+        else:
+            # unreadable partitions are re-parsed here, outside the pool
+            frames1, frames2 = next(parsed) if item_path in todo else process_item(item_path)
+            record_archive(manifest, item, fingerprints[item], {'documentmetadata': frames1, 'emotion_docs': frames2}, parts_dir)
+            status = 'parsed'
+        results.append((frames1, frames2))
+
+        # progress
+        print(f"Processed {idx + 1}/{len(items)}: {item} ({status})")
+
+    prune_archives(manifest, items, parts_dir)
+    save_manifest(manifest_path, manifest)
+
+    # save merged file
+    merged_df = merge_frames(results)
+    if merged_df is not None and args.format == 'parquet':
+        dataset_path = dataset_path_for(args.output)
+        write_partitioned(merged_df, dataset_path, date_column='Date')
+        print(f"Merged dataset saved to {dataset_path}")
+    elif merged_df is not None:
+        merged_df.to_csv(args.output, index=False)
+        print(f"Merged CSV file saved to {args.output}")
+    else:
+        print("One or both of the specified files were not found.")
+
+if __name__ == '__main__':
+    main()